@@ -0,0 +1 @@
+"""Benchmarks for the Nudge Household integration."""
@@ -0,0 +1,94 @@
+"""
+Compare the database and the row aggregation of the period sums.
+
+Run from this directory with ``python -m pytest -s bench_aggregation.py``.
+The result is printed as one JSON line.
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+import time
+from typing import TYPE_CHECKING
+
+from homeassistant.components.recorder import get_instance
+
+from custom_components.nudge_household.accumulator import PeriodAccumulator
+from custom_components.nudge_household.platform import (
+    NudgePeriod,
+    fetch_period_totals,
+)
+
+from .common import METERS, async_seed_meters
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from homeassistant.core import HomeAssistant
+
+YEARS = 3
+ROUNDS = 5
+
+
+async def async_time_executor_job(
+    hass: HomeAssistant, target: Callable[[], object]
+) -> tuple[float, object]:
+    """Return the wall time and the result of a recorder executor job."""
+    started = time.perf_counter()
+    result = await get_instance(hass).async_add_executor_job(target)
+    return time.perf_counter() - started, result
+
+
+async def bench_aggregation(
+    recorder_mock: object,  # noqa: ARG001
+    hass: HomeAssistant,
+) -> None:
+    """Time both aggregation paths for all periods and statistic IDs."""
+    await async_seed_meters(
+        hass,
+        YEARS * 365 * 24,
+        dict(METERS.values()),
+    )
+    statistic_ids = [statistic_id for statistic_id, _ in METERS.values()]
+    requested = {period: set(statistic_ids) for period in NudgePeriod}
+
+    timings: dict[str, list[float]] = {"database": [], "rows_cold": [], "rows_warm": []}
+    for _ in range(ROUNDS):
+        duration, totals = await async_time_executor_job(
+            hass, lambda: fetch_period_totals(hass, requested)
+        )
+        timings["database"].append(duration)
+
+        accumulator = PeriodAccumulator()
+        duration, sums = await async_time_executor_job(
+            hass,
+            lambda: accumulator.fetch(hass, requested),  # noqa: B023
+        )
+        timings["rows_cold"].append(duration)
+        duration, _ = await async_time_executor_job(
+            hass,
+            lambda: accumulator.fetch(hass, requested),  # noqa: B023
+        )
+        timings["rows_warm"].append(duration)
+
+        for period in NudgePeriod:
+            for statistic_id in statistic_ids:
+                assert abs(  # noqa: S101
+                    totals[period][statistic_id] - sums[period][statistic_id]
+                ) < 1e-6 * max(1.0, abs(totals[period][statistic_id]))
+
+    print(  # noqa: T201
+        json.dumps(
+            {
+                "benchmark": "aggregation",
+                "years": YEARS,
+                "statistic_ids": len(statistic_ids),
+                "periods": len(NudgePeriod),
+                "median_seconds": {
+                    path: statistics.median(durations)
+                    for path, durations in timings.items()
+                },
+            }
+        )
+    )
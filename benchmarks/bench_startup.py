@@ -0,0 +1,154 @@
+"""
+Measure what the integration costs while Home Assistant boots.
+
+Run from this directory with ``python -m pytest -s bench_startup.py``. The
+import of the integration is timed in a fresh interpreter that has already
+loaded what Home Assistant loads before any custom integration. The boot
+sets up configured households before Home Assistant has started, once with
+an empty and once with a restored statistics cache, and the started cycle
+is everything that follows EVENT_HOMEASSISTANT_STARTED. Every cycle is
+printed as one JSON line and appended to the file in ``BENCH_OUTPUT``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import CoreState
+
+from custom_components.nudge_household.const import DOMAIN_NUDGE_HOUSEHOLD
+from custom_components.nudge_household.scheduler import DATA_STATISTICS_SCHEDULER
+
+from .bench_update_cycle import async_run_cooldowns
+from .common import (
+    METERS,
+    CycleProbe,
+    async_configure_energy,
+    async_configure_household,
+    async_seed_meters,
+    meter_id,
+)
+
+if TYPE_CHECKING:
+    from freezegun.api import FrozenDateTimeFactory
+    from homeassistant.core import HomeAssistant
+
+IMPORT_ROUNDS = 5
+# Loaded by Home Assistant before it imports a custom integration.
+PRELOADED = (
+    "homeassistant.config_entries",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.helpers.update_coordinator",
+    "homeassistant.helpers.storage",
+    "homeassistant.components.number",
+    "homeassistant.components.sensor",
+    "numpy",
+)
+INTEGRATION = (
+    "custom_components.nudge_household",
+    "custom_components.nudge_household.config_flow",
+    "custom_components.nudge_household.number",
+    "custom_components.nudge_household.sensor",
+)
+IMPORT_PROBE = f"""
+import importlib, json, sys, time
+for module in {PRELOADED!r}:
+    importlib.import_module(module)
+started = time.perf_counter()
+for module in {INTEGRATION!r}:
+    importlib.import_module(module)
+print(json.dumps({{
+    "wall_seconds": time.perf_counter() - started,
+    "recorder_imported": "homeassistant.components.recorder" in sys.modules,
+}}))
+"""
+
+
+def emit(results: list[dict]) -> None:
+    """Print results as JSON lines and append them to BENCH_OUTPUT."""
+    lines = [json.dumps({"benchmark": "startup", **result}) for result in results]
+    print(*lines, sep="\n")  # noqa: T201
+    if output := os.environ.get("BENCH_OUTPUT"):
+        with open(output, "a", encoding="utf-8") as file:  # noqa: PTH123
+            file.writelines(f"{line}\n" for line in lines)
+
+
+def bench_import() -> None:
+    """Time the import of the integration in fresh interpreters."""
+    results = []
+    for _ in range(IMPORT_ROUNDS):
+        process = subprocess.run(  # noqa: S603
+            [sys.executable, "-c", IMPORT_PROBE],
+            capture_output=True,
+            check=True,
+            cwd=Path(__file__).parent.parent,
+            text=True,
+        )
+        results.append({"cycle": "import", **json.loads(process.stdout)})
+    emit(results)
+
+
+@pytest.mark.parametrize(("households", "days"), [(1, 365), (10, 60)])
+async def bench_boot(  # noqa: PLR0913
+    recorder_mock: object,  # noqa: ARG001
+    enable_custom_integrations: None,  # noqa: ARG001
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+    monkeypatch: pytest.MonkeyPatch,
+    households: int,
+    days: int,
+) -> None:
+    """Set configured households up again while Home Assistant boots."""
+    await async_seed_meters(
+        hass,
+        days * 24,
+        {
+            meter_id(meter, household): per_hour
+            for household in range(households)
+            for meter, (_, per_hour) in METERS.items()
+        },
+    )
+    await async_configure_energy(hass, 1)
+    for household in range(households):
+        await async_configure_household(hass, household)
+    await async_run_cooldowns(hass, freezer)
+    probe = CycleProbe(hass, monkeypatch)
+    entries = hass.config_entries.async_entries(DOMAIN_NUDGE_HOUSEHOLD)
+
+    async def restart(*, snapshot: bool) -> None:
+        """Unload every household and forget the cache as a restart would."""
+        scheduler = hass.data[DATA_STATISTICS_SCHEDULER]
+        if snapshot:
+            await scheduler._async_save_snapshot(None)  # noqa: SLF001
+        for entry in entries:
+            await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+        hass.data.pop(DATA_STATISTICS_SCHEDULER)
+        hass.set_state(CoreState.not_running)
+
+    async def boot() -> None:
+        for entry in entries:
+            await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+        # Booting takes longer than the cooldown of a requested refresh.
+        await async_run_cooldowns(hass, freezer)
+
+    async def started() -> None:
+        hass.set_state(CoreState.running)
+        hass.bus.async_fire(EVENT_HOMEASSISTANT_STARTED)
+        await hass.async_block_till_done()
+        await async_run_cooldowns(hass, freezer)
+
+    for cache in ("cold", "warm"):
+        await restart(snapshot=cache == "warm")
+        labels = {"households": households, "days": days, "cache": cache}
+        await probe.async_measure("boot", boot, **labels)
+        await probe.async_measure("started", started, **labels)
+    probe.emit("startup")
@@ -0,0 +1,119 @@
+"""
+Measure the update cycles of configured households.
+
+Run from this directory with ``python -m pytest -s bench_update_cycle.py``,
+add ``--dburl sqlite:///path/to/file.db`` for an SQLite file instead of an
+in-memory database. Every cycle is printed as one JSON line and appended to
+the file in ``BENCH_OUTPUT`` if it is set. The more households are set up,
+the shorter is their history, to keep the seeding time in bounds.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+import pytest
+from homeassistant.components.recorder import (
+    EVENT_RECORDER_HOURLY_STATISTICS_GENERATED,
+)
+from homeassistant.helpers.update_coordinator import REQUEST_REFRESH_DEFAULT_COOLDOWN
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.nudge_household.coordinator import LIVE_UPDATE_COOLDOWN
+
+from .common import (
+    METERS,
+    CycleProbe,
+    async_configure_energy,
+    async_configure_household,
+    async_seed_meters,
+    meter_id,
+)
+
+if TYPE_CHECKING:
+    from freezegun.api import FrozenDateTimeFactory
+    from homeassistant.core import HomeAssistant
+
+
+def advance_meters(hass: HomeAssistant, households: int, hours: float) -> None:
+    """Let every meter of every household consume for some hours."""
+    for household in range(households):
+        for meter, (_, per_hour) in METERS.items():
+            statistic_id = meter_id(meter, household)
+            state = hass.states.get(statistic_id)
+            value = float(state.state) + per_hour * hours
+            hass.states.async_set(statistic_id, str(value), state.attributes)
+
+
+async def async_run_cooldowns(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Let the debounced refreshes run, including the ones they trigger."""
+    for _ in range(2):
+        await hass.async_block_till_done(wait_background_tasks=True)
+        freezer.tick(timedelta(seconds=REQUEST_REFRESH_DEFAULT_COOLDOWN + 1))
+        async_fire_time_changed(hass)
+
+
+@pytest.mark.parametrize(("households", "days"), [(1, 730), (10, 60), (100, 7)])
+async def bench_update_cycle(  # noqa: PLR0913
+    recorder_mock: object,  # noqa: ARG001
+    enable_custom_integrations: None,  # noqa: ARG001
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+    monkeypatch: pytest.MonkeyPatch,
+    households: int,
+    days: int,
+) -> None:
+    """Set up households and measure the cycles that follow."""
+    await async_seed_meters(
+        hass,
+        days * 24,
+        {
+            meter_id(meter, household): per_hour
+            for household in range(households)
+            for meter, (_, per_hour) in METERS.items()
+        },
+    )
+    await async_configure_energy(hass, 1)
+    probe = CycleProbe(hass, monkeypatch)
+    labels = {"households": households, "days": days}
+
+    async def setup() -> None:
+        for household in range(households):
+            await async_configure_household(hass, household)
+        await hass.async_block_till_done()
+        await async_run_cooldowns(hass, freezer)
+
+    async def compile_hour() -> None:
+        freezer.tick(timedelta(hours=1))
+        advance_meters(hass, households, 1)
+        hass.bus.async_fire(EVENT_RECORDER_HOURLY_STATISTICS_GENERATED)
+        await hass.async_block_till_done()
+        await async_run_cooldowns(hass, freezer)
+
+    async def live_update() -> None:
+        advance_meters(hass, households, 0.1)
+        await hass.async_block_till_done()
+        advance_meters(hass, households, 0.1)
+        async_fire_time_changed(
+            hass, dt_util.utcnow() + timedelta(seconds=LIVE_UPDATE_COOLDOWN + 1)
+        )
+
+    async def new_day() -> None:
+        tomorrow = dt_util.start_of_local_day() + timedelta(days=1, minutes=1)
+        freezer.move_to(tomorrow)
+        advance_meters(hass, households, 1)
+        hass.bus.async_fire(EVENT_RECORDER_HOURLY_STATISTICS_GENERATED)
+        await hass.async_block_till_done()
+        await async_run_cooldowns(hass, freezer)
+
+    await probe.async_measure("setup", setup, **labels)
+    for _ in range(3):
+        await probe.async_measure("compile", compile_hour, **labels)
+    for _ in range(3):
+        await probe.async_measure("live", live_update, **labels)
+    await probe.async_measure("new_day", new_day, **labels)
+    probe.emit("update_cycle")
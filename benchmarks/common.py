@@ -0,0 +1,326 @@
+"""Synthetic recorder data and probes shared by the benchmarks."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+import voluptuous as vol
+from freezegun import api as freezegun_api
+from homeassistant import config_entries
+from homeassistant.components.energy import data as energydata
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder import statistics as recorder_statistics
+from homeassistant.components.recorder.statistics import async_import_statistics
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.data_entry_flow import FlowResultType
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.components.recorder.common import (
+    async_wait_recording_done,
+)
+
+from custom_components.nudge_household import accumulator, platform
+from custom_components.nudge_household.const import (
+    CONF_SUB_METER_GAS,
+    CONF_SUB_METER_GRID_EXPORT,
+    CONF_SUB_METER_GRID_IMPORT,
+    CONF_SUB_METER_SOLAR,
+    CONF_SUB_METER_WATER,
+    DOMAIN_NUDGE_HOUSEHOLD,
+)
+from custom_components.nudge_household.platform import NudgePeriod
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    import pytest
+    from homeassistant.config_entries import ConfigEntry, ConfigFlowResult
+    from homeassistant.core import Event, EventStateChangedData, HomeAssistant
+
+# Statistic ID and consumption per hour of every synthetic meter.
+METERS = {
+    "grid_import": ("sensor.grid_import", 0.4),
+    "grid_import_low_tariff": ("sensor.grid_import_low_tariff", 0.2),
+    "grid_export": ("sensor.grid_export", 0.3),
+    "solar": ("sensor.solar_production", 0.8),
+    "battery_import": ("sensor.battery_import", 0.2),
+    "battery_export": ("sensor.battery_export", 0.15),
+    "gas": ("sensor.gas", 1.2),
+    "water": ("sensor.water", 6.0),
+}
+
+FLOW_ANSWERS: dict[str, dict[str, Any]] = {
+    "user": {"name_household": "Benchmark", "heat_source": "Gas"},
+}
+
+
+def suggested_answers(result: ConfigFlowResult) -> dict[str, Any]:
+    """Return the prefilled values of a form, as a user taking the suggestions."""
+    return {
+        key.schema: key.default()
+        for key in result["data_schema"].schema
+        if key.default is not vol.UNDEFINED
+    }
+
+
+def meter_id(meter: str, household: int = 0) -> str:
+    """Return the statistic ID of a meter of a household."""
+    statistic_id = METERS[meter][0]
+    return statistic_id if household == 0 else f"{statistic_id}_{household}"
+
+
+async def async_seed_meters(
+    hass: HomeAssistant, hours: int, statistic_ids: dict[str, float]
+) -> None:
+    """Import hourly sum statistics and set a matching state for every meter."""
+    start = dt_util.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(
+        hours=hours
+    )
+    for statistic_id, per_hour in statistic_ids.items():
+        metadata = {
+            "has_mean": False,
+            "has_sum": True,
+            "name": None,
+            "source": "recorder",
+            "statistic_id": statistic_id,
+            "unit_of_measurement": "kWh",
+        }
+        async_import_statistics(
+            hass,
+            metadata,
+            [
+                {
+                    "start": start + timedelta(hours=hour),
+                    "state": per_hour * (hour + 1),
+                    "sum": per_hour * (hour + 1),
+                }
+                for hour in range(hours)
+            ],
+        )
+        hass.states.async_set(
+            statistic_id,
+            str(per_hour * hours),
+            {
+                "unit_of_measurement": "kWh",
+                "device_class": "energy",
+                "state_class": "total_increasing",
+            },
+        )
+    await async_wait_recording_done(hass)
+
+
+async def async_configure_energy(hass: HomeAssistant, households: int) -> None:
+    """Add the meters of every household to the Energy Dashboard."""
+    sources: list[dict[str, Any]] = []
+    for household in range(households):
+        sources.extend(
+            [
+                {
+                    "type": "grid",
+                    "flow_from": [
+                        {
+                            "stat_energy_from": meter_id(meter, household),
+                            "stat_cost": None,
+                            "entity_energy_price": None,
+                            "number_energy_price": None,
+                        }
+                        for meter in ("grid_import", "grid_import_low_tariff")
+                    ],
+                    "flow_to": [
+                        {
+                            "stat_energy_to": meter_id("grid_export", household),
+                            "stat_compensation": None,
+                            "entity_energy_price": None,
+                            "number_energy_price": None,
+                        }
+                    ],
+                    "cost_adjustment_day": 0,
+                },
+                {
+                    "type": "solar",
+                    "stat_energy_from": meter_id("solar", household),
+                    "config_entry_solar_forecast": None,
+                },
+                {
+                    "type": "battery",
+                    "stat_energy_from": meter_id("battery_import", household),
+                    "stat_energy_to": meter_id("battery_export", household),
+                },
+                {
+                    "type": "gas",
+                    "stat_energy_from": meter_id("gas", household),
+                    "stat_cost": None,
+                    "entity_energy_price": None,
+                    "number_energy_price": None,
+                },
+                {
+                    "type": "water",
+                    "stat_energy_from": meter_id("water", household),
+                    "stat_cost": None,
+                    "entity_energy_price": None,
+                    "number_energy_price": None,
+                },
+            ]
+        )
+    manager = await energydata.async_get_manager(hass)
+    await manager.async_update({"energy_sources": sources})
+
+
+def sub_meter_answers(household: int) -> dict[str, list[str]]:
+    """Return the config flow answers for the sub meters of a household."""
+    return {
+        CONF_SUB_METER_GRID_IMPORT: [
+            meter_id("grid_import", household),
+            meter_id("grid_import_low_tariff", household),
+        ],
+        CONF_SUB_METER_GRID_EXPORT: [meter_id("grid_export", household)],
+        CONF_SUB_METER_SOLAR: [meter_id("solar", household)],
+        CONF_SUB_METER_GAS: [meter_id("gas", household)],
+        CONF_SUB_METER_WATER: [meter_id("water", household)],
+    }
+
+
+async def async_configure_household(hass: HomeAssistant, household: int) -> ConfigEntry:
+    """
+    Walk through the config flow and return the created entry.
+
+    The first household uses the Energy Dashboard, all others their sub meters.
+    """
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN_NUDGE_HOUSEHOLD, context={"source": config_entries.SOURCE_USER}
+    )
+    while result["type"] in (FlowResultType.FORM, FlowResultType.SHOW_PROGRESS):
+        if result["type"] is FlowResultType.SHOW_PROGRESS:
+            # The flow goes on by itself once the history was queried.
+            await hass.async_block_till_done()
+            result = await hass.config_entries.flow.async_configure(result["flow_id"])
+            continue
+        answers = FLOW_ANSWERS.get(result["step_id"]) or suggested_answers(result)
+        if result["step_id"] == "user":
+            answers = {**answers, "name_household": f"Household {household}"}
+            if household:
+                answers |= sub_meter_answers(household)
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], answers
+        )
+    if result["type"] is not FlowResultType.CREATE_ENTRY:
+        msg = f"Config flow ended with {result['type']}"
+        raise RuntimeError(msg)
+    await hass.async_block_till_done()
+    return result["result"]
+
+
+class CycleProbe:
+    """
+    Measure what one update cycle of the integration costs.
+
+    Counts the recorder queries, the time spent in recorder executor jobs and
+    the state writes of the integration entities per Nudge Period. Times are
+    taken from the real clock, the benchmarks move the frozen one.
+    """
+
+    def __init__(self, hass: HomeAssistant, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Patch the recorder entry points used by the integration."""
+        self.hass = hass
+        self._lock = threading.Lock()
+        self.results: list[dict[str, Any]] = []
+        self._queries: Counter[str] = Counter()
+        self._executor_seconds = 0.0
+        self._writes: Counter[str] = Counter()
+        # Modules that import the recorder lazily look the functions up there.
+        for module in (recorder_statistics, accumulator, platform):
+            for name in ("statistics_during_period", "statistic_during_period"):
+                if hasattr(module, name):
+                    self._count(monkeypatch, module, name)
+
+        instance = get_instance(hass)
+        add_executor_job = instance.async_add_executor_job
+
+        def timed_executor_job(target: Callable[..., Any], *args: Any) -> Any:
+            def run() -> Any:
+                started = freezegun_api.real_perf_counter()
+                try:
+                    return target(*args)
+                finally:
+                    with self._lock:
+                        self._executor_seconds += (
+                            freezegun_api.real_perf_counter() - started
+                        )
+
+            return add_executor_job(run)
+
+        monkeypatch.setattr(instance, "async_add_executor_job", timed_executor_job)
+        hass.bus.async_listen(EVENT_STATE_CHANGED, self._async_state_changed)
+
+    def _count(
+        self, monkeypatch: pytest.MonkeyPatch, module: object, name: str
+    ) -> None:
+        """Count the calls of a recorder function used by a module."""
+        function = getattr(module, name)
+
+        def counted(*args: Any) -> Any:
+            with self._lock:
+                self._queries[name] += 1
+            return function(*args)
+
+        monkeypatch.setattr(module, name, counted)
+
+    def _async_state_changed(self, event: Event[EventStateChangedData]) -> None:
+        """Count a state write of an integration entity by its period."""
+        entry = er.async_get(self.hass).async_get(event.data["entity_id"])
+        if entry is None or entry.platform != DOMAIN_NUDGE_HOUSEHOLD:
+            return
+        group = next(
+            (
+                period.name
+                for period in NudgePeriod
+                if entry.unique_id.endswith(f"_{period.name}")
+            ),
+            entry.domain,
+        )
+        self._writes[group] += 1
+
+    async def async_measure(
+        self, cycle: str, run: Callable[[], Any], **labels: Any
+    ) -> dict[str, Any]:
+        """Run one cycle and record its cost."""
+        self._queries.clear()
+        self._writes.clear()
+        self._executor_seconds = 0.0
+        tracemalloc.start()
+        started = freezegun_api.real_perf_counter()
+        await run()
+        # Debounced refreshes of the coordinators run as background tasks.
+        await self.hass.async_block_till_done(wait_background_tasks=True)
+        await get_instance(self.hass).async_block_till_done()
+        await self.hass.async_block_till_done(wait_background_tasks=True)
+        wall_seconds = freezegun_api.real_perf_counter() - started
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result = {
+            "cycle": cycle,
+            **labels,
+            "wall_seconds": wall_seconds,
+            "executor_seconds": self._executor_seconds,
+            "queries": dict(self._queries),
+            "state_writes": dict(self._writes),
+            "peak_memory_bytes": peak_bytes,
+        }
+        self.results.append(result)
+        return result
+
+    def emit(self, benchmark: str) -> None:
+        """Print the results as JSON lines and append them to BENCH_OUTPUT."""
+        lines = [
+            json.dumps({"benchmark": benchmark, **result}) for result in self.results
+        ]
+        print(*lines, sep="\n")  # noqa: T201
+        if output := os.environ.get("BENCH_OUTPUT"):
+            with open(output, "a", encoding="utf-8") as file:  # noqa: PTH123
+                file.writelines(f"{line}\n" for line in lines)
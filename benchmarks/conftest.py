@@ -0,0 +1,3 @@
+"""Fixtures for the benchmarks of the Nudge Household integration."""
+
+pytest_plugins = ["pytest_homeassistant_custom_component"]
@@ -4,14 +4,26 @@ Custom integration to integrate nudge_apps with Home Assistant.
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Any
 
 from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.start import async_at_started
 
 if TYPE_CHECKING:
-    from homeassistant.core import HomeAssistant
+    from collections.abc import Callable, Coroutine
 
-from .const import MyConfigEntry, MyData
+from .backfill import HistoryBackfill
+from .const import CONF_INSTRUMENTATION, DOMAIN_NUDGE_HOUSEHOLD, MyConfigEntry, MyData
+from .coordinator import NudgeStatisticsCoordinator
+from .history import ScoreHistory
+from .instrumentation import Instrumentation
+from .resolver import UniqueIdResolver
+from .rollover import YearlyRollover
+from .scoreboard import Scoreboard
+from .settlement import DailySettlement
 
 PLATFORMS: list[Platform] = [Platform.NUMBER, Platform.SENSOR]
 
@@ -20,6 +32,94 @@ async def async_setup_entry(
     hass: HomeAssistant,
     entry: MyConfigEntry,
 ) -> bool:
-    entry.runtime_data = MyData(score_device_unique_ids={})
+    instrumentation = Instrumentation(
+        enabled=entry.options.get(CONF_INSTRUMENTATION, False)
+    )
+    scoreboard = Scoreboard(instrumentation)
+    history = ScoreHistory(hass, entry.entry_id)
+    await history.async_load()
+    settlement = DailySettlement(hass, scoreboard, history)
+    # Without registered entities the household is set up for the first time.
+    first_setup = not er.async_entries_for_config_entry(
+        er.async_get(hass), entry.entry_id
+    )
+    entry.runtime_data = MyData(
+        resolver=UniqueIdResolver(hass, DOMAIN_NUDGE_HOUSEHOLD, instrumentation),
+        coordinator=NudgeStatisticsCoordinator(
+            hass, entry, instrumentation=instrumentation
+        ),
+        scoreboard=scoreboard,
+        settlement=settlement,
+        instrumentation=instrumentation,
+        backfill=HistoryBackfill(
+            hass, settlement, scoreboard, history, instrumentation
+        ),
+        rollover=YearlyRollover(hass, entry, instrumentation),
+        history=history,
+        options=dict(entry.options),
+    )
+    entry.async_on_unload(entry.runtime_data.resolver.async_start())
+    entry.async_on_unload(entry.runtime_data.coordinator.async_start())
+    entry.async_on_unload(entry.runtime_data.settlement.async_start())
+    entry.async_on_unload(entry.runtime_data.rollover.async_start())
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    await entry.runtime_data.coordinator.async_load_snapshot()
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # Recorder queries wait until Home Assistant started, so they do not
+    # compete with the boot of the other integrations.
+    if first_setup:
+        entry.async_on_unload(
+            async_at_started(
+                hass,
+                partial(
+                    _async_start_task,
+                    entry,
+                    entry.runtime_data.backfill.async_run,
+                    "history backfill",
+                ),
+            )
+        )
+    if entry.runtime_data.rollover.is_due:
+        # Home Assistant was not running at the turn of the year.
+        entry.async_on_unload(
+            async_at_started(
+                hass,
+                partial(
+                    _async_start_task,
+                    entry,
+                    entry.runtime_data.rollover.async_run,
+                    "yearly rollover",
+                ),
+            )
+        )
     return True
+
+
+@callback
+def _async_start_task(
+    entry: MyConfigEntry,
+    target: Callable[[], Coroutine[Any, Any, None]],
+    name: str,
+    hass: HomeAssistant,
+) -> None:
+    """Run a recorder job of the entry in the background."""
+    entry.async_create_background_task(
+        hass, target(), f"{DOMAIN_NUDGE_HOUSEHOLD} {name} {entry.entry_id}"
+    )
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: MyConfigEntry) -> bool:
+    """Unload the platforms of the entry."""
+    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: MyConfigEntry) -> None:
+    """Delete the stored history of a removed household."""
+    await ScoreHistory(hass, entry.entry_id).async_remove()
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: MyConfigEntry) -> None:
+    """Reload the entry after the options changed."""
+    if entry.options == entry.runtime_data.options:
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -0,0 +1,336 @@
+"""Incremental aggregation of long-term statistics per Nudge Period."""
+
+from __future__ import annotations
+
+import threading
+from base64 import b64decode, b64encode
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from homeassistant.util import dt as dt_util
+
+from .instrumentation import CACHE_DAILY_SERIES, COUNTER_QUERIES, Instrumentation
+from .platform import (
+    STATISTIC_TYPE_CHANGE,
+    STATISTIC_TYPE_STATE,
+    NudgePeriod,
+    fetch_statistic_changes,
+    get_start_time,
+)
+
+if TYPE_CHECKING:
+    from datetime import date, datetime
+
+    from homeassistant.core import HomeAssistant
+
+# Closed days kept for the forecasts, even when no period needs them any more.
+HISTORY_DAYS = 365
+HOUR_SECONDS = timedelta(hours=1).total_seconds()
+
+
+def _fetch_daily_series(
+    hass: HomeAssistant,
+    start_time: datetime,
+    end_time: datetime,
+    statistic_ids: set[str],
+) -> dict[str, np.ndarray]:
+    """Return one value per day between start and end for every statistic ID."""
+    first_day = start_time.date()
+    days = (end_time.date() - first_day).days
+    series = {statistic_id: np.zeros(days) for statistic_id in statistic_ids}
+    if days <= 0:
+        return series
+    changes = fetch_statistic_changes(hass, start_time, end_time, statistic_ids)
+    for statistic_id, rows in changes.items():
+        for day, change in rows:
+            index = (day - first_day).days
+            if 0 <= index < days:
+                series[statistic_id][index] += change
+    return series
+
+
+class PeriodAccumulator:
+    """
+    Cache the daily change of every statistic ID since the longest period start.
+
+    Closed days are read once as a single daily series, the hours of the open
+    day are added as they are compiled. All Nudge Periods are derived from the
+    same series with prefix sums, so they stay consistent with each other.
+    The series reaches back at least HISTORY_DAYS for the forecasts.
+
+    The whole cache can be saved and restored, so a restart only reads the
+    days and hours after the last compiled ones.
+
+    The queries of a fetch run without the lock of the cache, their results
+    are swapped in at once. So the event loop never waits for the recorder
+    when it reads the cache, only fetches wait for each other.
+    """
+
+    def __init__(self) -> None:
+        """Set up an empty cache."""
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._series_start: datetime | None = None
+        self._closed_until: datetime | None = None
+        self._series: dict[str, np.ndarray] = {}
+        self._open_day: datetime | None = None
+        self._open_sums: dict[str, float] = {}
+        # Timestamp of the end of the last compiled hour added per statistic ID.
+        self._open_until: dict[str, float] = {}
+        self._last_states: dict[str, float] = {}
+
+    @property
+    def last_states(self) -> dict[str, float]:
+        """Return the state of every meter at the end of the last compiled hour."""
+        with self._lock:
+            return dict(self._last_states)
+
+    def retain(self, statistic_ids: set[str]) -> None:
+        """Drop every cached statistic ID that is not requested any more."""
+        with self._fetch_lock, self._lock:
+            for cache in (
+                self._series,
+                self._open_sums,
+                self._open_until,
+                self._last_states,
+            ):
+                for statistic_id in cache.keys() - statistic_ids:
+                    del cache[statistic_id]
+
+    def daily_history(self) -> tuple[date | None, dict[str, np.ndarray]]:
+        """Return the first day and the closed days of every cached statistic ID."""
+        with self._lock:
+            if self._series_start is None:
+                return None, {}
+            return self._series_start.date(), dict(self._series)
+
+    def _update_series(
+        self,
+        hass: HomeAssistant,
+        series_start: datetime,
+        statistic_ids: set[str],
+        today: datetime,
+        instrumentation: Instrumentation,
+    ) -> None:
+        """Move the cached series to the start and add all closed days."""
+        closed_until = self._closed_until
+        all_series = self._series
+        if (
+            self._series_start is None
+            or closed_until is None
+            or not self._series_start <= series_start <= closed_until
+        ):
+            closed_until = series_start
+            all_series = {}
+        elif series_start > self._series_start:
+            # A day or a period passed, drop the days nobody needs any more.
+            offset = (series_start.date() - self._series_start.date()).days
+            all_series = {
+                statistic_id: series[offset:]
+                for statistic_id, series in all_series.items()
+            }
+
+        new_ids = statistic_ids - all_series.keys()
+        instrumentation.cache(
+            CACHE_DAILY_SERIES, hit=not new_ids and closed_until >= today
+        )
+        if new_ids:
+            instrumentation.count(f"{COUNTER_QUERIES}statistics_during_period")
+            all_series = {
+                **all_series,
+                **_fetch_daily_series(hass, series_start, closed_until, new_ids),
+            }
+
+        if closed_until < today:
+            instrumentation.count(f"{COUNTER_QUERIES}statistics_during_period")
+            closed_days = _fetch_daily_series(
+                hass, closed_until, today, set(all_series)
+            )
+            all_series = {
+                statistic_id: np.concatenate((series, closed_days[statistic_id]))
+                for statistic_id, series in all_series.items()
+            }
+            closed_until = today
+
+        with self._lock:
+            self._series_start = series_start
+            self._closed_until = closed_until
+            self._series = all_series
+
+    def _update_open_day(
+        self,
+        hass: HomeAssistant,
+        statistic_ids: set[str],
+        today: datetime,
+        instrumentation: Instrumentation,
+    ) -> None:
+        """Add the hours compiled since the last update to the open day."""
+        from homeassistant.components.recorder.statistics import (
+            statistics_during_period,
+        )
+
+        if self._open_day == today:
+            open_sums = dict(self._open_sums)
+            open_until = dict(self._open_until)
+            last_states = dict(self._last_states)
+        else:
+            open_sums, open_until, last_states = {}, {}, {}
+        day_start = today.timestamp()
+        # The last hour of yesterday is compiled after midnight, it is only
+        # read for the state the meters start the day with.
+        first_hour = day_start - HOUR_SECONDS
+        start = min(
+            open_until.get(statistic_id, first_hour) for statistic_id in statistic_ids
+        )
+        instrumentation.count(f"{COUNTER_QUERIES}statistics_during_period")
+        stats = statistics_during_period(
+            hass,
+            dt_util.utc_from_timestamp(start),
+            None,
+            statistic_ids,
+            "hour",
+            None,
+            {STATISTIC_TYPE_CHANGE, STATISTIC_TYPE_STATE},
+        )
+        for statistic_id in statistic_ids:
+            open_sums.setdefault(statistic_id, 0.0)
+        for statistic_id, rows in stats.items():
+            until = open_until.get(statistic_id, first_hour)
+            for row in rows:
+                # Statistic IDs that are further along started the query earlier.
+                if row["start"] < until:
+                    continue
+                if row["start"] >= day_start:
+                    open_sums[statistic_id] += row.get(STATISTIC_TYPE_CHANGE) or 0.0
+                if row.get(STATISTIC_TYPE_STATE) is not None:
+                    last_states[statistic_id] = row[STATISTIC_TYPE_STATE]
+                until = row["start"] + HOUR_SECONDS
+            open_until[statistic_id] = until
+
+        with self._lock:
+            self._open_day = today
+            self._open_sums = open_sums
+            self._open_until = open_until
+            self._last_states = last_states
+
+    def _period_sums(
+        self, requested: dict[NudgePeriod, set[str]], now: datetime
+    ) -> dict[NudgePeriod, dict[str, float]]:
+        """Return the sums of every period from the cache, hold the lock."""
+        if self._series_start is None:
+            return {}
+        period_starts = {period: get_start_time(period, now) for period in requested}
+        ordered_ids = sorted(set().union(*requested.values()))
+        days = np.vstack([self._series[statistic_id] for statistic_id in ordered_ids])
+        prefix = np.zeros((len(ordered_ids), days.shape[1] + 1))
+        np.cumsum(days, axis=1, out=prefix[:, 1:])
+        first_days = np.array(
+            [
+                (period_starts[period].date() - self._series_start.date()).days
+                for period in requested
+            ]
+        )
+        open_values = np.array(
+            [self._open_sums[statistic_id] for statistic_id in ordered_ids]
+        )
+        period_sums = (
+            prefix[:, -1:] - prefix[:, first_days] + open_values[:, np.newaxis]
+        )
+        index = {statistic_id: row for row, statistic_id in enumerate(ordered_ids)}
+        return {
+            period: {
+                statistic_id: float(period_sums[index[statistic_id], column])
+                for statistic_id in period_ids
+            }
+            for column, (period, period_ids) in enumerate(requested.items())
+        }
+
+    def fetch(
+        self,
+        hass: HomeAssistant,
+        requested: dict[NudgePeriod, set[str]],
+        instrumentation: Instrumentation | None = None,
+    ) -> dict[NudgePeriod, dict[str, float]]:
+        """Return the sums of every period, run in the recorder executor."""
+        if instrumentation is None:
+            instrumentation = Instrumentation(enabled=False)
+        now = dt_util.now()
+        today = get_start_time(NudgePeriod.Daily, now)
+        statistic_ids: set[str] = set().union(*requested.values())
+        if not statistic_ids:
+            return {}
+        # Periods without statistic IDs still keep their days in the series.
+        series_start = min(
+            *(get_start_time(period, now) for period in requested),
+            today - timedelta(days=HISTORY_DAYS),
+        )
+
+        with self._fetch_lock:
+            self._update_series(
+                hass, series_start, statistic_ids, today, instrumentation
+            )
+            self._update_open_day(hass, statistic_ids, today, instrumentation)
+            with self._lock:
+                return self._period_sums(requested, now)
+
+    def cached_sums(
+        self, requested: dict[NudgePeriod, set[str]]
+    ) -> dict[NudgePeriod, dict[str, float]] | None:
+        """Return the sums of every period without a query, None if not cached."""
+        now = dt_util.now()
+        today = get_start_time(NudgePeriod.Daily, now)
+        statistic_ids: set[str] = set().union(*requested.values())
+        with self._lock:
+            if (
+                not statistic_ids
+                or self._series_start is None
+                or self._closed_until != today
+                or self._open_day != today
+                or not statistic_ids <= self._series.keys() & self._open_sums.keys()
+                or any(
+                    get_start_time(period, now) < self._series_start
+                    for period in requested
+                )
+            ):
+                return None
+            return self._period_sums(requested, now)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the whole cache for the storage, empty if nothing is cached."""
+        with self._lock:
+            if self._series_start is None or self._closed_until is None:
+                return {}
+            return {
+                "series_start": self._series_start.isoformat(),
+                "closed_until": self._closed_until.isoformat(),
+                "series": {
+                    statistic_id: b64encode(series.astype("<f8").tobytes()).decode()
+                    for statistic_id, series in self._series.items()
+                },
+                "open_day": self._open_day.isoformat() if self._open_day else None,
+                "open_sums": dict(self._open_sums),
+                "open_until": dict(self._open_until),
+                "last_states": dict(self._last_states),
+            }
+
+    def restore(self, data: dict[str, Any]) -> None:
+        """Take over a saved cache if nothing is cached yet."""
+
+        def parse(value: str) -> datetime | None:
+            parsed = dt_util.parse_datetime(value)
+            return dt_util.as_local(parsed) if parsed else None
+
+        with self._lock:
+            if not data or self._series_start is not None:
+                return
+            self._series_start = parse(data["series_start"])
+            self._closed_until = parse(data["closed_until"])
+            self._series = {
+                statistic_id: np.frombuffer(b64decode(series), dtype="<f8").copy()
+                for statistic_id, series in data["series"].items()
+            }
+            self._open_day = parse(data["open_day"]) if data["open_day"] else None
+            self._open_sums = dict(data["open_sums"])
+            self._open_until = dict(data["open_until"])
+            self._last_states = dict(data["last_states"])
@@ -0,0 +1,186 @@
+"""One-time seeding of scores and streaks from the recorder history."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+import numpy as np
+from homeassistant.util import dt as dt_util
+
+from .instrumentation import COUNTER_QUERIES, HISTOGRAM_RECORDER_JOB
+from .platform import (
+    NudgePeriod,
+    NudgeType,
+    fetch_statistic_changes,
+    get_start_time,
+)
+
+if TYPE_CHECKING:
+    from datetime import date, datetime
+
+    from homeassistant.core import HomeAssistant
+
+    from .history import ScoreHistory
+    from .instrumentation import Instrumentation
+    from .scoreboard import Scoreboard
+    from .settlement import DailySettlement
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BackfillState(StrEnum):
+    """Where the backfill of a household stands."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class DailyHistory:
+    """Outcome of the past days of one Nudge Type."""
+
+    points: int
+    streak: int
+    best_streak: int
+
+
+@dataclass
+class DailySeries:
+    """Daily change of every meter from its first recorded day until yesterday."""
+
+    first_day: date
+    values: dict[str, np.ndarray]
+    recorded: dict[str, np.ndarray]
+
+    @property
+    def days(self) -> int:
+        """Return the number of days in the series."""
+        return next(iter(self.values.values())).size if self.values else 0
+
+
+def fetch_daily_history(
+    hass: HomeAssistant, end_time: datetime, statistic_ids: set[str]
+) -> DailySeries:
+    """Return the whole daily history before end in one query, run in the executor."""
+    changes = fetch_statistic_changes(
+        hass, dt_util.utc_from_timestamp(0), end_time, statistic_ids
+    )
+    rows = [
+        (statistic_id, day, change)
+        for statistic_id, days in changes.items()
+        for day, change in days
+    ]
+    last_day = end_time.date()
+    first_day = min((day for _, day, _ in rows), default=last_day)
+    days = (last_day - first_day).days
+    values = {statistic_id: np.zeros(days) for statistic_id in statistic_ids}
+    recorded = {
+        statistic_id: np.zeros(days, dtype=bool) for statistic_id in statistic_ids
+    }
+    for statistic_id, day, change in rows:
+        index = (day - first_day).days
+        if 0 <= index < days:
+            values[statistic_id][index] += change
+            recorded[statistic_id][index] = True
+    return DailySeries(first_day, values, recorded)
+
+
+def summarize_days(reached: np.ndarray, first_scored_day: int) -> DailyHistory:
+    """Return the points since a day, the current and the best streak."""
+    # Every run of reached days starts at a rising and ends at a falling edge.
+    edges = np.diff(np.concatenate(([0], reached.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    return DailyHistory(
+        points=int(np.count_nonzero(reached[max(first_scored_day, 0) :])),
+        streak=int(lengths[-1]) if lengths.size and ends[-1] == reached.size else 0,
+        best_streak=int(lengths.max()) if lengths.size else 0,
+    )
+
+
+class HistoryBackfill:
+    """
+    Seed the scores and streaks of a new household from the recorder history.
+
+    The daily history of all meters is read in one query. Every Daily Nudge
+    evaluates it against its daily goal in one vectorized pass, and only days
+    with recorded statistics count. Scores start at the beginning of the year,
+    because they are reset every new year, streaks use the whole history.
+    The evaluated days are kept in the stored history of the household.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        settlement: DailySettlement,
+        scoreboard: Scoreboard,
+        history: ScoreHistory,
+        instrumentation: Instrumentation,
+    ) -> None:
+        """Set up a backfill that has not run yet."""
+        self.hass = hass
+        self._settlement = settlement
+        self._scoreboard = scoreboard
+        self._history = history
+        self._instrumentation = instrumentation
+        self.state = BackfillState.PENDING
+        self.progress = 0.0
+        self.days = 0
+
+    def _set_progress(self, progress: float) -> None:
+        """Report how far the backfill is."""
+        self.progress = progress
+        _LOGGER.debug("Backfill of the history at %d%%", progress * 100)
+
+    async def async_run(self) -> None:
+        """Query, evaluate and apply the history."""
+        from homeassistant.components.recorder import get_instance
+
+        nudges = self._settlement.nudges
+        statistic_ids: set[str] = set().union(
+            *(nudge.statistic_ids for nudge in nudges)
+        )
+        if not statistic_ids:
+            self.state = BackfillState.DONE
+            self._set_progress(1.0)
+            return
+        self.state = BackfillState.RUNNING
+        today = get_start_time(NudgePeriod.Daily)
+        started = self._instrumentation.start()
+        self._instrumentation.count(f"{COUNTER_QUERIES}statistics_during_period")
+        try:
+            series = await get_instance(self.hass).async_add_executor_job(
+                fetch_daily_history, self.hass, today, statistic_ids
+            )
+        except Exception:
+            self.state = BackfillState.FAILED
+            _LOGGER.exception("Backfill of the history failed")
+            return
+        self._instrumentation.observe(HISTOGRAM_RECORDER_JOB, "backfill", started)
+        self.days = series.days
+        self._set_progress(0.5)
+
+        first_scored_day = (
+            get_start_time(NudgePeriod.Yearly, today).date() - series.first_day
+        ).days
+        histories: dict[NudgeType, DailyHistory] = {}
+        for done, nudge in enumerate(nudges, start=1):
+            recorded = np.zeros(series.days, dtype=bool)
+            for statistic_id in nudge.statistic_ids:
+                recorded |= series.recorded[statistic_id]
+            reached = nudge.evaluate_history(series.values, series.days) & recorded
+            histories[nudge.nudge_type] = summarize_days(reached, first_scored_day)
+            self._history.async_seed(
+                nudge.nudge_type, series.first_day, reached, recorded
+            )
+            self._set_progress(0.5 + 0.5 * done / len(nudges))
+
+        self._scoreboard.async_apply_history(histories)
+        self.state = BackfillState.DONE
+        _LOGGER.debug("Backfilled %d days: %s", series.days, histories)
@@ -1,20 +1,19 @@
-from typing import Any
-import homeassistant.components.energy.data as energydata
+import logging
+from typing import TYPE_CHECKING, Any
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.components.sensor.const import (
     DOMAIN as SENSOR_DOMAIN,
     SensorDeviceClass,
 )
-from homeassistant.components.energy import (
-    is_configured as energy_dashboard_is_configured,
-)
 from homeassistant.helpers import selector
+from homeassistant.helpers.importlib import async_import_module
 import homeassistant.helpers.config_validation as cv
 from custom_components.nudge_household.platform import (
     NudgeType,
 )
 from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
 
 from .const import (
     CONF_AUTARKY_GOAL,
@@ -27,7 +26,12 @@ from .const import (
     CONF_LAST_YEAR_CONSUMED,
     CONF_NAME_HOUSEHOLD,
     CONF_SIZE_HOUSEHOLD,
-    CONF_TITLE,
+    CONF_GOALS_YEAR,
+    CONF_SUB_METER_GAS,
+    CONF_SUB_METER_GRID_EXPORT,
+    CONF_SUB_METER_GRID_IMPORT,
+    CONF_SUB_METER_SOLAR,
+    CONF_SUB_METER_WATER,
     DOMAIN_NUDGE_HOUSEHOLD,
     CONF_BUDGET_YEARLY_ELECTRICITY,
     CONF_BUDGET_YEARLY_HEAT,
@@ -37,100 +41,29 @@ from .const import (
     CONF_BUDGET_HEAT_REDUCTION_GOAL,
     CONF_AUTARKY_GOAL_INCREASE,
     CONF_BUDGET_WATER_REDUCTION_GOAL,
-    CONF_BUDGET_YEARLY_WATER
+    CONF_BUDGET_YEARLY_WATER,
+    CONF_REFRESH_INTERVALS,
+    CONF_INSTRUMENTATION,
+    CONF_AGGREGATION_MODE,
+    DEFAULT_REFRESH_INTERVALS,
 )
 from homeassistant.data_entry_flow import FlowResult
+from .platform import EnergyTopology
+from .scheduler import AggregationMode
+from .suggestions import (
+    DEFAULT_AUTARKY,
+    DEFAULT_AUTARKY_GOAL_INCREASE,
+    DEFAULT_BUDGET,
+    DEFAULT_REDUCTION_GOAL,
+    GoalSuggestion,
+    async_suggest_goals,
+)
+from .topology import async_get_energy_topology, get_sub_meter_topology
 
-DATA_SCHEMAS = {
-    NudgeType.ELECTRICITY_BUDGET: vol.Schema(
-        {
-            vol.Required(CONF_BUDGET_YEARLY_ELECTRICITY): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1000,
-                    max=10000,
-                    step=100,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="kWh",
-                )
-            ),
-            vol.Required(
-                CONF_BUDGET_ELECTRICITY_REDUCTION_GOAL
-            ): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1,
-                    max=50,
-                    step=1,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="%",
-                )
-            ),
-        }
-    ),
-    NudgeType.HEAT_BUDGET: vol.Schema(
-        {
-            vol.Required(CONF_BUDGET_YEARLY_HEAT): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1000,
-                    max=10000,
-                    step=100,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="kWh",
-                )
-            ),
-            vol.Required(CONF_BUDGET_HEAT_REDUCTION_GOAL): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1,
-                    max=50,
-                    step=1,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="%",
-                )
-            ),
-        }
-    ),
-    NudgeType.AUTARKY_GOAL: vol.Schema(
-        {
-            vol.Required(CONF_AUTARKY_GOAL): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1,
-                    max=100,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="%",
-                )
-            ),
-            vol.Required(CONF_AUTARKY_GOAL_INCREASE): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1,
-                    max=50,
-                    step=1,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="%",
-                )
-            ),
-        }
-    ),
-    NudgeType.WATER_BUDGET: vol.Schema(
-        {
-            vol.Required(CONF_BUDGET_YEARLY_WATER): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1000,
-                    max=10000,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="liter",
-                )
-            ),
-            vol.Required(CONF_BUDGET_WATER_REDUCTION_GOAL): selector.NumberSelector(
-                selector.NumberSelectorConfig(
-                    min=1,
-                    max=50,
-                    step=1,
-                    mode=selector.NumberSelectorMode.SLIDER,
-                    unit_of_measurement="%",
-                )
-            ),
-        }
-    ),
-}
+if TYPE_CHECKING:
+    import asyncio
+
+_LOGGER = logging.getLogger(__name__)
 
 SCHEMA_HEAT_PUMP = vol.Schema(
     {
@@ -146,6 +79,88 @@ SCHEMA_HEAT_PUMP = vol.Schema(
     }
 )
 
+REDUCTION_GOAL_SELECTOR = selector.NumberSelector(
+    selector.NumberSelectorConfig(
+        min=1,
+        max=50,
+        step=1,
+        mode=selector.NumberSelectorMode.SLIDER,
+        unit_of_measurement="%",
+    )
+)
+
+
+def goal_selector(suggestion: GoalSuggestion, unit: str) -> selector.NumberSelector:
+    """Return a slider over the range of a goal suggestion."""
+    return selector.NumberSelector(
+        selector.NumberSelectorConfig(
+            min=suggestion.minimum,
+            max=suggestion.maximum,
+            step=suggestion.step,
+            mode=selector.NumberSelectorMode.SLIDER,
+            unit_of_measurement=unit,
+        )
+    )
+
+
+def budget_schema(
+    conf_goal: str, conf_reduction: str, suggestion: GoalSuggestion, unit: str
+) -> vol.Schema:
+    """Return the schema of a budget prefilled from a suggestion."""
+    return vol.Schema(
+        {
+            vol.Required(conf_goal, default=suggestion.default): goal_selector(
+                suggestion, unit
+            ),
+            vol.Required(
+                conf_reduction, default=DEFAULT_REDUCTION_GOAL
+            ): REDUCTION_GOAL_SELECTOR,
+        }
+    )
+
+
+def build_data_schemas(
+    suggestions: dict[NudgeType, GoalSuggestion], *, heat_pump: bool
+) -> dict[NudgeType, vol.Schema]:
+    """Return the schemas of the goal steps of one flow."""
+    autarky = suggestions.get(NudgeType.AUTARKY_GOAL, DEFAULT_AUTARKY)
+    schemas = {
+        NudgeType.ELECTRICITY_BUDGET: budget_schema(
+            CONF_BUDGET_YEARLY_ELECTRICITY,
+            CONF_BUDGET_ELECTRICITY_REDUCTION_GOAL,
+            suggestions.get(NudgeType.ELECTRICITY_BUDGET, DEFAULT_BUDGET),
+            "kWh",
+        ),
+        NudgeType.HEAT_BUDGET: budget_schema(
+            CONF_BUDGET_YEARLY_HEAT,
+            CONF_BUDGET_HEAT_REDUCTION_GOAL,
+            suggestions.get(NudgeType.HEAT_BUDGET, DEFAULT_BUDGET),
+            "kWh",
+        ),
+        NudgeType.AUTARKY_GOAL: vol.Schema(
+            {
+                vol.Required(CONF_AUTARKY_GOAL, default=autarky.default): goal_selector(
+                    autarky, "%"
+                ),
+                vol.Required(
+                    CONF_AUTARKY_GOAL_INCREASE, default=DEFAULT_AUTARKY_GOAL_INCREASE
+                ): REDUCTION_GOAL_SELECTOR,
+            }
+        ),
+        NudgeType.WATER_BUDGET: budget_schema(
+            CONF_BUDGET_YEARLY_WATER,
+            CONF_BUDGET_WATER_REDUCTION_GOAL,
+            suggestions.get(NudgeType.WATER_BUDGET, DEFAULT_BUDGET),
+            "liter",
+        ),
+    }
+    if heat_pump:
+        schemas[NudgeType.HEAT_BUDGET] = schemas[NudgeType.HEAT_BUDGET].extend(
+            SCHEMA_HEAT_PUMP.schema
+        )
+    return schemas
+
+
 SCHMEMA_HOUSEHOLD_INFOS = vol.Schema(
     {
         vol.Required(CONF_NAME_HOUSEHOLD): cv.string,
@@ -181,6 +196,24 @@ SCHMEMA_HOUSEHOLD_INFOS = vol.Schema(
             )
         ),
     }
+    | {
+        # Sub meters of a household in a building with several households,
+        # without any the meters of the Energy Dashboard are used.
+        vol.Optional(conf): selector.EntitySelector(
+            selector.EntitySelectorConfig(
+                domain=SENSOR_DOMAIN,
+                multiple=True,
+                filter=selector.EntityFilterSelectorConfig(device_class=device_class),
+            )
+        )
+        for conf, device_class in (
+            (CONF_SUB_METER_GRID_IMPORT, SensorDeviceClass.ENERGY),
+            (CONF_SUB_METER_GRID_EXPORT, SensorDeviceClass.ENERGY),
+            (CONF_SUB_METER_SOLAR, SensorDeviceClass.ENERGY),
+            (CONF_SUB_METER_GAS, SensorDeviceClass.GAS),
+            (CONF_SUB_METER_WATER, SensorDeviceClass.WATER),
+        )
+    }
 )
 
 
@@ -198,7 +231,44 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
         return self.async_show_form(
             step_id="init",
-            data_schema=vol.Schema({vol.Required("test"): bool}),
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        option,
+                        default=self.config_entry.options.get(
+                            option, DEFAULT_REFRESH_INTERVALS[period]
+                        ),
+                    ): selector.NumberSelector(
+                        selector.NumberSelectorConfig(
+                            min=0,
+                            max=1440,
+                            step=5,
+                            mode=selector.NumberSelectorMode.BOX,
+                            unit_of_measurement="min",
+                        )
+                    )
+                    for period, option in CONF_REFRESH_INTERVALS.items()
+                }
+                | {
+                    vol.Required(
+                        CONF_INSTRUMENTATION,
+                        default=self.config_entry.options.get(
+                            CONF_INSTRUMENTATION, False
+                        ),
+                    ): selector.BooleanSelector(),
+                    vol.Required(
+                        CONF_AGGREGATION_MODE,
+                        default=self.config_entry.options.get(
+                            CONF_AGGREGATION_MODE, AggregationMode.ROWS
+                        ),
+                    ): selector.SelectSelector(
+                        selector.SelectSelectorConfig(
+                            options=[mode.value for mode in AggregationMode],
+                            translation_key=CONF_AGGREGATION_MODE,
+                        )
+                    ),
+                }
+            ),
         )
 
 
@@ -214,6 +284,11 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN_NUDGE_HOUSEHOLD):
     def __init__(self) -> None:
         self.data = {}
         self.nudge_support = {}
+        self.data_schemas: dict[NudgeType, vol.Schema] = {}
+        self._topology: EnergyTopology | None = None
+        self._suggestions_task: asyncio.Task[dict[NudgeType, GoalSuggestion]] | None = (
+            None
+        )
 
     @staticmethod
     @callback
@@ -226,131 +301,114 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN_NUDGE_HOUSEHOLD):
     async def validate_input(self, user_input) -> dict[NudgeType, bool]:
         nudge_support = {nudge_type: False for nudge_type in NudgeType}
 
-        energy_manager = await energydata.async_get_manager(self.hass)
-
-        energy_manager_data: energydata.EnergyPreferences | None = energy_manager.data
+        self._topology = topology = (
+            get_sub_meter_topology(user_input)
+            or (await async_get_energy_topology(self.hass)).topology
+        )
 
-        if energy_manager_data is not None:
-            energy_sources: list[energydata.SourceType] = energy_manager_data[
-                "energy_sources"
-            ]
-        heat_pump = nudge_support[NudgeType.HEAT_BUDGET] = (
+        nudge_support[NudgeType.HEAT_BUDGET] = (
             user_input[CONF_HEAT_SOURCE] == CONF_HEAT_OPTIONS[1]
         )
-        if heat_pump:
-            # Create a new schema by merging the original and the heat pump schema
-            heat_budget_schema = vol.Schema(
-                {
-                    **DATA_SCHEMAS[
-                        NudgeType.HEAT_BUDGET
-                    ].schema,  # Get the underlying schema dictionary
-                    **SCHEMA_HEAT_PUMP.schema,  # Add the heat pump fields
-                }
-            )
-            # Update the global DATA_SCHEMAS dictionary
-            DATA_SCHEMAS[NudgeType.HEAT_BUDGET] = heat_budget_schema
-
-        for source in energy_sources:
-            if source["type"] == "grid":
-                nudge_support[NudgeType.ELECTRICITY_BUDGET] = True
-            elif source["type"] == "gas":
-                nudge_support[NudgeType.HEAT_BUDGET] = True
-            elif source["type"] == "solar":
-                nudge_support[NudgeType.AUTARKY_GOAL] = True
-            elif source["type"] == "water":
-                nudge_support[NudgeType.WATER_BUDGET] = True
+
+        for nudge_type in topology.supported_nudge_types:
+            nudge_support[nudge_type] = True
         return nudge_support
 
     async def async_step_user(self, user_input=None):
-        if not await energy_dashboard_is_configured(self.hass):
-            return self.async_abort(reason="Energy dashboard not configured")
-        if user_input is not None:
-            self.data = user_input
-            self.nudge_support = await self.validate_input(user_input=user_input)
-            for nudge_type, is_configured in self.nudge_support.items():
-                if is_configured:
-                    self.nudge_support[nudge_type] = False
-                    return self.async_show_form(
-                        step_id=STEP_IDS[nudge_type],
-                        data_schema=DATA_SCHEMAS[nudge_type],
-                    )
-
-            return self.async_create_entry(title=CONF_TITLE, data=self.data)
-
-        return self.async_show_form(step_id="user", data_schema=SCHMEMA_HOUSEHOLD_INFOS)
-
-    async def async_step_electricity(self, user_input=None):
         errors = {}
         if user_input is not None:
-            self.data.update(user_input)
-            for nudge_type, is_configured in self.nudge_support.items():
-                if is_configured:
-                    self.nudge_support[nudge_type] = False
-                    return self.async_show_form(
-                        step_id=STEP_IDS[nudge_type],
-                        data_schema=DATA_SCHEMAS[nudge_type],
-                    )
-            return self.async_create_entry(title=CONF_TITLE, data=self.data)
+            self._async_abort_entries_match(
+                {CONF_NAME_HOUSEHOLD: user_input[CONF_NAME_HOUSEHOLD]}
+            )
+            energy = await async_import_module(
+                self.hass, "homeassistant.components.energy"
+            )
+            if get_sub_meter_topology(
+                user_input
+            ) is None and not await energy.is_configured(self.hass):
+                errors["base"] = "energy_dashboard_not_configured"
+        if user_input is not None and not errors:
+            self.data = {**user_input, CONF_GOALS_YEAR: dt_util.now().year}
+            self.nudge_support = await self.validate_input(user_input=user_input)
+            return await self.async_step_history()
 
         return self.async_show_form(
-            step_id=STEP_IDS[NudgeType.ELECTRICITY_BUDGET],
-            data_schema=DATA_SCHEMAS[NudgeType.ELECTRICITY_BUDGET],
-            errors=errors,
+            step_id="user", data_schema=SCHMEMA_HOUSEHOLD_INFOS, errors=errors
         )
 
-    async def async_step_heat(self, user_input=None):
-        errors = {}
-        if user_input is not None:
-            self.data.update(user_input)
-            for nudge_type, is_configured in self.nudge_support.items():
-                if is_configured:
-                    self.nudge_support[nudge_type] = False
-                    return self.async_show_form(
-                        step_id=STEP_IDS[nudge_type],
-                        data_schema=DATA_SCHEMAS[nudge_type],
-                    )
-            return self.async_create_entry(title=CONF_TITLE, data=self.data)
-
-        return self.async_show_form(
-            step_id=STEP_IDS[NudgeType.HEAT_BUDGET],
-            data_schema=DATA_SCHEMAS[NudgeType.HEAT_BUDGET],
-            errors=errors,
+    async def async_step_history(
+        self,
+        user_input: dict[str, Any] | None = None,  # noqa: ARG002
+    ) -> FlowResult:
+        """Suggest the goals from last year's consumption, queried in the background."""
+        if self._suggestions_task is None:
+            self._suggestions_task = self.hass.async_create_background_task(
+                async_suggest_goals(
+                    self.hass,
+                    self._topology or EnergyTopology(),
+                    {
+                        nudge_type
+                        for nudge_type, supported in self.nudge_support.items()
+                        if supported
+                    },
+                ),
+                f"{DOMAIN_NUDGE_HOUSEHOLD} goal suggestions {self.flow_id}",
+            )
+        if not self._suggestions_task.done():
+            # The progress is reached from the user step, so it needs its step ID.
+            return self.async_show_progress(
+                step_id="history",
+                progress_action="history",
+                progress_task=self._suggestions_task,
+            )
+        try:
+            suggestions = self._suggestions_task.result()
+        except Exception:
+            _LOGGER.exception("Suggesting goals from the history failed")
+            suggestions = {}
+        self.data_schemas = build_data_schemas(
+            suggestions,
+            heat_pump=self.data[CONF_HEAT_SOURCE] == CONF_HEAT_OPTIONS[1],
         )
+        return self.async_show_progress_done(next_step_id="goals")
 
-    async def async_step_autarky(self, user_input=None):
-        errors = {}
+    async def async_step_goals(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Show the goal of the next Nudge Type, create the entry after the last."""
         if user_input is not None:
             self.data.update(user_input)
-            for nudge_type, is_configured in self.nudge_support.items():
-                if is_configured:
-                    self.nudge_support[nudge_type] = False
-                    return self.async_show_form(
-                        step_id=STEP_IDS[nudge_type],
-                        data_schema=SCHMEMA_HOUSEHOLD_INFOS,
-                    )
-            return self.async_create_entry(title=CONF_TITLE, data=self.data)
-
-        return self.async_show_form(
-            step_id=STEP_IDS[NudgeType.AUTARKY_GOAL],
-            data_schema=DATA_SCHEMAS[NudgeType.AUTARKY_GOAL],
-            errors=errors,
+        for nudge_type, is_configured in self.nudge_support.items():
+            if is_configured:
+                self.nudge_support[nudge_type] = False
+                return self.async_show_form(
+                    step_id=STEP_IDS[nudge_type],
+                    data_schema=self.data_schemas[nudge_type],
+                )
+        return self.async_create_entry(
+            title=self.data[CONF_NAME_HOUSEHOLD], data=self.data
         )
 
-    async def async_step_water(self, user_input=None):
-        errors = {}
-        if user_input is not None:
-            self.data.update(user_input)
-            for nudge_type, is_configured in self.nudge_support.items():
-                if is_configured:
-                    self.nudge_support[nudge_type] = False
-                    return self.async_show_form(
-                        step_id=STEP_IDS[nudge_type],
-                        data_schema=DATA_SCHEMAS[nudge_type],
-                    )
-            return self.async_create_entry(title=CONF_TITLE, data=self.data)
+    async def async_step_electricity(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Take the electricity budget and go on with the next goal."""
+        return await self.async_step_goals(user_input)
 
-        return self.async_show_form(
-            step_id=STEP_IDS[NudgeType.HEAT_BUDGET],
-            data_schema=DATA_SCHEMAS[NudgeType.HEAT_BUDGET],
-            errors=errors,
-        )
+    async def async_step_heat(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Take the heat budget and go on with the next goal."""
+        return await self.async_step_goals(user_input)
+
+    async def async_step_autarky(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Take the autarky goal and go on with the next goal."""
+        return await self.async_step_goals(user_input)
+
+    async def async_step_water(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Take the water budget and go on with the next goal."""
+        return await self.async_step_goals(user_input)
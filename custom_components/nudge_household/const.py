@@ -1,9 +1,23 @@
 """Constants."""
 
-from custom_components.nudge_household.platform import NudgeType
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from custom_components.nudge_household.platform import NudgePeriod, NudgeType
 from homeassistant.config_entries import ConfigEntry
 from dataclasses import dataclass
 
+if TYPE_CHECKING:
+    from .backfill import HistoryBackfill
+    from .coordinator import NudgeStatisticsCoordinator
+    from .history import ScoreHistory
+    from .instrumentation import Instrumentation
+    from .resolver import UniqueIdResolver
+    from .rollover import YearlyRollover
+    from .scoreboard import Scoreboard
+    from .settlement import DailySettlement
+
 DOMAIN_NUDGE_HOUSEHOLD = "nudge_household"
 CONF_SIZE_HOUSEHOLD = "number_persons"
 CONF_ENERGIE_EFFICIENCY = "final_energy_consumption"
@@ -11,6 +25,8 @@ CONF_APARTMENT_SIZE = "apartment_size"
 CONF_E_Charger = "e_charger"
 CONF_HEAT_PUMP = "heat_pump"
 CONF_LAST_YEAR_CONSUMED = "last_year_consumed"
+# Year the goals in the entry data were set for by the yearly rollover.
+CONF_GOALS_YEAR = "goals_year"
 CONF_HEAT_SOURCE = "heat_source"
 CONF_TITLE = "Nudge Household"
 CONF_HOUSEHOLD_INFOS = "Household Infos"
@@ -23,7 +39,37 @@ CONF_BUDGET_HEAT_REDUCTION_GOAL = "budget_heat_reduction_goal"
 CONF_NAME_HOUSEHOLD = "name_household"
 CONF_BUDGET_YEARLY_WATER = "budget_yearly_water"
 CONF_BUDGET_WATER_REDUCTION_GOAL = "budget_water_reduction_goal"
+CONF_REFRESH_INTERVALS = {
+    NudgePeriod.Daily: "refresh_interval_daily",
+    NudgePeriod.Weekly: "refresh_interval_weekly",
+    NudgePeriod.Monthly: "refresh_interval_monthly",
+    NudgePeriod.Yearly: "refresh_interval_yearly",
+}
+# Minutes, zero refreshes on every compilation of the statistics.
+DEFAULT_REFRESH_INTERVALS = {
+    NudgePeriod.Daily: 0,
+    NudgePeriod.Weekly: 60,
+    NudgePeriod.Monthly: 120,
+    NudgePeriod.Yearly: 240,
+}
 
+# Meters of a household with its own sub meters instead of the Energy Dashboard.
+CONF_SUB_METER_GRID_IMPORT = "sub_meter_grid_import"
+CONF_SUB_METER_GRID_EXPORT = "sub_meter_grid_export"
+CONF_SUB_METER_SOLAR = "sub_meter_solar"
+CONF_SUB_METER_GAS = "sub_meter_gas"
+CONF_SUB_METER_WATER = "sub_meter_water"
+CONF_SUB_METERS = [
+    CONF_SUB_METER_GRID_IMPORT,
+    CONF_SUB_METER_GRID_EXPORT,
+    CONF_SUB_METER_SOLAR,
+    CONF_SUB_METER_GAS,
+    CONF_SUB_METER_WATER,
+]
+# Collect runtime costs for the diagnostics and the debug sensors.
+CONF_INSTRUMENTATION = "instrumentation"
+# Where the period sums are calculated, one of the AggregationMode values.
+CONF_AGGREGATION_MODE = "aggregation_mode"
 
 CONF_HEAT_OPTIONS = [
     "Gas",
@@ -44,4 +90,13 @@ type MyConfigEntry = ConfigEntry[MyData]
 
 @dataclass
 class MyData:
-    score_device_unique_ids: dict[NudgeType, str]
+    resolver: UniqueIdResolver
+    coordinator: NudgeStatisticsCoordinator
+    scoreboard: Scoreboard
+    settlement: DailySettlement
+    instrumentation: Instrumentation
+    backfill: HistoryBackfill
+    rollover: YearlyRollover
+    history: ScoreHistory
+    # Options the entry was set up with, changes of the data need no reload.
+    options: dict[str, Any]
@@ -0,0 +1,463 @@
+"""Coordinator that batches the long-term statistics queries of a household."""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    CoreState,
+    Event,
+    EventStateChangedData,
+    HomeAssistant,
+    State,
+    callback,
+    valid_entity_id,
+)
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_AGGREGATION_MODE,
+    CONF_REFRESH_INTERVALS,
+    DEFAULT_REFRESH_INTERVALS,
+)
+from .instrumentation import Instrumentation
+from .platform import NudgePeriod
+from .scheduler import (
+    AggregationMode,
+    PeriodStatistics,
+    async_get_statistics_scheduler,
+)
+
+if TYPE_CHECKING:
+    from datetime import date, datetime
+
+    from homeassistant.config_entries import ConfigEntry
+
+    from .forecast import ForecastModel
+
+_LOGGER = logging.getLogger(__name__)
+
+REQUEST_REFRESH_COOLDOWN = 1.0
+LIVE_UPDATE_COOLDOWN = 10.0
+MAX_REFRESH_BACKOFF = 8
+# Compilations do not happen at the exact same second every hour.
+REFRESH_TOLERANCE = timedelta(minutes=5)
+
+
+@dataclass
+class RefreshSchedule:
+    """
+    Decide when the statistics of a Nudge Period are refreshed next.
+
+    The interval doubles every time a refresh did not change any value, up to
+    MAX_REFRESH_BACKOFF times the configured interval. An interval of zero
+    refreshes on every compilation.
+    """
+
+    interval: timedelta
+    current: timedelta = field(init=False)
+    due: datetime | None = None
+
+    def __post_init__(self) -> None:
+        """Start with the configured interval."""
+        self.current = self.interval
+
+    def is_due(self, now: datetime) -> bool:
+        """Return if the period should be refreshed now."""
+        return self.due is None or now >= self.due
+
+    def expedite(self) -> None:
+        """Refresh the period with the next refresh."""
+        self.due = None
+
+    def reschedule(self, now: datetime, *, changed: bool) -> None:
+        """Plan the next refresh after a refresh of the period."""
+        if changed:
+            self.current = self.interval
+        else:
+            self.current = min(self.current * 2, self.interval * MAX_REFRESH_BACKOFF)
+        self.due = now + self.current - REFRESH_TOLERANCE
+
+
+class NudgeStatisticsCoordinator(DataUpdateCoordinator[PeriodStatistics]):
+    """
+    Fetch the statistics of all Nudges of a config entry in one batch.
+
+    The coordinator does not poll. Long-term statistics only change when the
+    recorder compiles them, so a refresh is requested after every hourly
+    compilation in which one of the source entities changed its state.
+
+    Every Nudge Period has its own refresh schedule, so a Yearly value that
+    barely moves is not queried and published as often as a Daily one.
+
+    In hybrid mode the live state of every meter entity is added on top of
+    the compiled hours, so the Nudges follow the meters between compilations
+    without any query.
+
+    The queries themselves are merged with the ones of all other households
+    by the shared StatisticsScheduler. While Home Assistant starts, the Nudges
+    are shown from the cache the scheduler restored, and the first refresh
+    waits until Home Assistant has started.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: ConfigEntry,
+        *,
+        hybrid: bool = True,
+        instrumentation: Instrumentation | None = None,
+    ) -> None:
+        """Set up the coordinator for a config entry."""
+        from homeassistant.components.recorder import (
+            EVENT_RECORDER_HOURLY_STATISTICS_GENERATED,
+        )
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{config_entry.title} statistics",
+            request_refresh_debouncer=Debouncer(
+                hass,
+                _LOGGER,
+                cooldown=REQUEST_REFRESH_COOLDOWN,
+                immediate=False,
+            ),
+        )
+        self._registrations: dict[NudgePeriod, list[set[str]]] = defaultdict(list)
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
+        self._scheduler = async_get_statistics_scheduler(hass)
+        self.hybrid = hybrid
+        self._aggregation_mode = AggregationMode(
+            config_entry.options.get(CONF_AGGREGATION_MODE, AggregationMode.ROWS)
+        )
+        self._schedules = {
+            period: RefreshSchedule(
+                timedelta(
+                    minutes=config_entry.options.get(
+                        CONF_REFRESH_INTERVALS[period],
+                        DEFAULT_REFRESH_INTERVALS[period],
+                    )
+                )
+            )
+            for period in NudgePeriod
+        }
+        self._compiled: PeriodStatistics = {}
+        self._baselines: dict[NudgePeriod, dict[str, float]] = defaultdict(dict)
+        self._live_deltas: dict[NudgePeriod, dict[str, float]] = defaultdict(dict)
+        self._published_at: dict[NudgePeriod, datetime] = {}
+        self._live_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=LIVE_UPDATE_COOLDOWN,
+            immediate=True,
+            function=self._async_publish_live,
+        )
+        self._changed_ids: dict[NudgePeriod, set[str]] = {
+            period: set() for period in NudgePeriod
+        }
+        self._tracked_ids: set[str] = set()
+        self._untracked_ids: set[str] = set()
+        self._refreshed_on: date | None = None
+        self.warm_started = False
+        self._unsub_started: CALLBACK_TYPE | None = None
+        self._unsub_state_changes: CALLBACK_TYPE | None = None
+        self._unsub_compiled = hass.bus.async_listen(
+            EVENT_RECORDER_HOURLY_STATISTICS_GENERATED, self._async_statistics_compiled
+        )
+
+    @callback
+    def async_register_statistics(
+        self, statistic_ids: set[str], period: NudgePeriod
+    ) -> CALLBACK_TYPE:
+        """Add statistic IDs to the batch and return a callback to remove them."""
+        registration = set(statistic_ids)
+        self._registrations[period].append(registration)
+        self._changed_ids[period] |= registration
+        self._schedules[period].expedite()
+
+        @callback
+        def remove_registration() -> None:
+            self._registrations[period].remove(registration)
+
+        return remove_registration
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Keep the statistic IDs of the household in the shared cache."""
+        return self._scheduler.async_add_source(self._async_statistic_ids)
+
+    @callback
+    def _async_statistic_ids(self) -> set[str]:
+        """Return every statistic ID the Nudges of the household request."""
+        return set().union(*self.requested_statistics.values())
+
+    @property
+    def refresh_schedules(self) -> dict[NudgePeriod, RefreshSchedule]:
+        """Return the refresh schedule of every Nudge Period."""
+        return dict(self._schedules)
+
+    @property
+    def requested_statistics(self) -> dict[NudgePeriod, set[str]]:
+        """Return the union of all registered statistic IDs per period."""
+        return {
+            period: set().union(*registrations)
+            for period, registrations in self._registrations.items()
+            if registrations
+        }
+
+    @property
+    def aggregation_mode(self) -> AggregationMode:
+        """Return where the period sums of the household are calculated."""
+        return self._scheduler.async_aggregation_mode(self._aggregation_mode)
+
+    @property
+    def shared_instrumentation(self) -> Instrumentation:
+        """Return the costs of the recorder jobs shared by all households."""
+        return self._scheduler.instrumentation
+
+    @property
+    def forecast(self) -> ForecastModel:
+        """Return the forecast model fitted to the statistics of all households."""
+        return self._scheduler.forecast
+
+    async def async_load_snapshot(self) -> None:
+        """Restore the cache of the last run before the Nudges are added."""
+        await self._scheduler.async_load_snapshot()
+
+    async def async_refresh_when_started(self) -> None:
+        """Refresh now, or publish the restored cache until Home Assistant started."""
+        if self.hass.state is CoreState.running:
+            await self.async_request_refresh()
+            return
+        # The recorder is left alone while the other integrations boot.
+        self._async_publish_cached()
+        if self._unsub_started is None:
+            self._unsub_started = async_at_started(self.hass, self._async_started)
+
+    @callback
+    def _async_publish_cached(self) -> bool:
+        """Publish the period sums of the restored cache, return False without."""
+        if self.aggregation_mode is not AggregationMode.ROWS:
+            return False
+        cached = self._scheduler.accumulator.cached_sums(self.requested_statistics)
+        if cached is None:
+            return False
+        self._compiled.update(cached)
+        self.warm_started = True
+        self.data = {**(self.data or {}), **cached}
+        self.async_update_listeners()
+        return True
+
+    async def _async_started(self, _: HomeAssistant) -> None:
+        """Catch up on what was compiled after the restored cache."""
+        self._unsub_started = None
+        await self.async_request_refresh()
+
+    async def async_fetch_statistics(
+        self, requested: dict[NudgePeriod, set[str]]
+    ) -> PeriodStatistics:
+        """Return the period sums from the scheduler shared by all households."""
+        if not any(requested.values()):
+            return {}
+        return await self._scheduler.async_fetch(
+            requested, self.instrumentation, self._aggregation_mode
+        )
+
+    @callback
+    def _async_source_changed(self, event: Event[EventStateChangedData]) -> None:
+        """Remember that the statistics of a source entity will change."""
+        entity_id = event.data["entity_id"]
+        for changed_ids in self._changed_ids.values():
+            changed_ids.add(entity_id)
+        if self.hybrid and self._async_update_live_delta(
+            entity_id, event.data["new_state"]
+        ):
+            self._live_debouncer.async_schedule_call()
+
+    @staticmethod
+    def get_meter_value(state: State | None) -> float | None:
+        """Return the reading of a meter state, None if it has none."""
+        if state is None:
+            return None
+        try:
+            return float(state.state)
+        except ValueError:
+            return None
+
+    @callback
+    def _async_update_live_delta(self, entity_id: str, state: State | None) -> bool:
+        """Set the change of a meter since the last compiled hour of every period."""
+        if (value := self.get_meter_value(state)) is None:
+            return False
+        updated = False
+        for period, baselines in self._baselines.items():
+            if (baseline := baselines.get(entity_id)) is None:
+                continue
+            # A meter that went backwards was reset and counts again from zero.
+            delta = value - baseline if value >= baseline else value
+            if self._live_deltas[period].get(entity_id) != delta:
+                self._live_deltas[period][entity_id] = delta
+                updated = True
+        return updated
+
+    @callback
+    def _async_set_baselines(self, affected: dict[NudgePeriod, set[str]]) -> None:
+        """Take the compiled meter states as the start of the live deltas."""
+        if not self.hybrid:
+            return
+        # The database totals include the short-term statistics, so the live
+        # state at the refresh is their baseline, not the last compiled hour.
+        compiled_states = (
+            self._scheduler.accumulator.last_states
+            if self.aggregation_mode is AggregationMode.ROWS
+            else {}
+        )
+        for period, statistic_ids in affected.items():
+            baselines = self._baselines[period]
+            for statistic_id in statistic_ids & self._tracked_ids:
+                state = self.hass.states.get(statistic_id)
+                self._live_deltas[period].pop(statistic_id, None)
+                baseline = compiled_states.get(statistic_id)
+                if baseline is None:
+                    # Without a compiled hour today the live state is the baseline.
+                    baseline = self.get_meter_value(state)
+                if baseline is None:
+                    baselines.pop(statistic_id, None)
+                    continue
+                baselines[statistic_id] = baseline
+        for statistic_id in set().union(*affected.values()) & self._tracked_ids:
+            self._async_update_live_delta(
+                statistic_id, self.hass.states.get(statistic_id)
+            )
+
+    def _with_live_deltas(self, period: NudgePeriod) -> dict[str, float]:
+        """Return the compiled sums of a period with the live change added."""
+        live_deltas = self._live_deltas.get(period, {})
+        return {
+            statistic_id: value + live_deltas.get(statistic_id, 0.0)
+            for statistic_id, value in self._compiled.get(period, {}).items()
+        }
+
+    async def _async_publish_live(self) -> None:
+        """Hand the live values of the due periods to the Nudges."""
+        if not self._compiled:
+            return
+        now = dt_util.now()
+        data = dict(self.data or {})
+        for period in self._compiled:
+            published_at = self._published_at.get(period)
+            if published_at is None or (
+                now - published_at >= self._schedules[period].current
+            ):
+                data[period] = self._with_live_deltas(period)
+                self._published_at[period] = now
+        # async_set_updated_data would cancel a refresh waiting for its cooldown.
+        self.data = data
+        self.async_update_listeners()
+
+    async def _async_statistics_compiled(self, _: Event) -> None:
+        """Refresh after the recorder compiled statistics of changed sources."""
+        now = dt_util.now()
+        if self._refreshed_on != now.date() or any(
+            schedule.is_due(now) and (self._changed_ids[period] or self._untracked_ids)
+            for period, schedule in self._schedules.items()
+        ):
+            await self.async_request_refresh()
+
+    @callback
+    def _async_track_sources(self, statistic_ids: set[str]) -> None:
+        """Follow the state changes of all sources that are entities."""
+        entity_ids = {
+            statistic_id
+            for statistic_id in statistic_ids
+            if valid_entity_id(statistic_id)
+        }
+        # External statistics have no state to follow, so they always count.
+        self._untracked_ids = statistic_ids - entity_ids
+        if entity_ids == self._tracked_ids:
+            return
+        if self._unsub_state_changes:
+            self._unsub_state_changes()
+            self._unsub_state_changes = None
+        self._tracked_ids = entity_ids
+        if entity_ids:
+            self._unsub_state_changes = async_track_state_change_event(
+                self.hass, entity_ids, self._async_source_changed
+            )
+
+    async def _async_update_data(self) -> PeriodStatistics:
+        """Fetch the statistics of all changed sources of due periods in one job."""
+        requested = self.requested_statistics
+        statistic_ids: set[str] = set().union(*requested.values())
+        self._async_track_sources(statistic_ids)
+
+        now = dt_util.now()
+        # A new day starts new periods for every source.
+        new_day = self._refreshed_on != now.date()
+        self._refreshed_on = now.date()
+        due = {
+            period
+            for period in requested
+            if new_day or self._schedules[period].is_due(now)
+        }
+        # Periods that are not due keep their days in the series of the rows.
+        affected: dict[NudgePeriod, set[str]] = {period: set() for period in requested}
+        for period in due:
+            changed = requested[period] if new_day else self._changed_ids[period]
+            affected[period] = requested[period] & (changed | self._untracked_ids)
+            self._changed_ids[period] = set()
+        try:
+            result = await self.async_fetch_statistics(affected)
+        except Exception:
+            for period, ids in affected.items():
+                self._changed_ids[period] |= ids
+            self._refreshed_on = None
+            raise
+
+        for period in due:
+            previous = self._compiled.get(period, {})
+            sums = result.get(period, {})
+            self._compiled[period] = {
+                statistic_id: value
+                for statistic_id, value in {**previous, **sums}.items()
+                if statistic_id in requested[period]
+            }
+            self._schedules[period].reschedule(
+                now,
+                changed=any(
+                    previous.get(statistic_id) != value
+                    for statistic_id, value in sums.items()
+                ),
+            )
+        for period in set(self._compiled) - set(requested):
+            del self._compiled[period]
+        self._async_set_baselines(affected)
+
+        data = dict(self.data or {})
+        for period in requested:
+            if period in due or period not in data:
+                data[period] = self._with_live_deltas(period)
+                self._published_at[period] = now
+        return {period: data[period] for period in requested}
+
+    async def async_shutdown(self) -> None:
+        """Stop following the recorder and the source entities."""
+        await super().async_shutdown()
+        self._live_debouncer.async_shutdown()
+        self._unsub_compiled()
+        if self._unsub_started:
+            self._unsub_started()
+            self._unsub_started = None
+        if self._unsub_state_changes:
+            self._unsub_state_changes()
+            self._unsub_state_changes = None
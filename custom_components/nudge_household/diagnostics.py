@@ -0,0 +1,67 @@
+"""Diagnostics of a household for the download in the integration page."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.components.diagnostics import async_redact_data
+
+from .const import CONF_NAME_HOUSEHOLD
+from .platform import NudgeType
+from .topology import async_get_energy_topology, get_sub_meter_topology
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+    from .const import MyConfigEntry
+
+TO_REDACT = {CONF_NAME_HOUSEHOLD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: MyConfigEntry
+) -> dict[str, Any]:
+    """Return the configuration, the statistics batch and the runtime costs."""
+    coordinator = entry.runtime_data.coordinator
+    topology = (
+        get_sub_meter_topology(entry.data)
+        or (await async_get_energy_topology(hass)).topology
+    )
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "topology": {
+            nudge_type.name: sorted(topology.statistic_ids(nudge_type))
+            for nudge_type in NudgeType
+            if nudge_type in topology.supported_nudge_types
+        },
+        "coordinator": {
+            "aggregation_mode": coordinator.aggregation_mode,
+            "hybrid": coordinator.hybrid,
+            "forecast_fitted_on": coordinator.forecast.fitted_on,
+            "warm_started": coordinator.warm_started,
+            "last_update_success": coordinator.last_update_success,
+            "requested_statistics": {
+                period.name: sorted(statistic_ids)
+                for period, statistic_ids in coordinator.requested_statistics.items()
+            },
+            "refresh_schedules": {
+                period.name: {
+                    "interval": str(schedule.interval),
+                    "current": str(schedule.current),
+                    "due": schedule.due.isoformat() if schedule.due else None,
+                }
+                for period, schedule in coordinator.refresh_schedules.items()
+            },
+        },
+        "backfill": {
+            "state": entry.runtime_data.backfill.state,
+            "progress": entry.runtime_data.backfill.progress,
+            "days": entry.runtime_data.backfill.days,
+        },
+        "history": entry.runtime_data.history.as_dict(),
+        "instrumentation": entry.runtime_data.instrumentation.as_dict(),
+        "shared_instrumentation": coordinator.shared_instrumentation.as_dict(),
+    }
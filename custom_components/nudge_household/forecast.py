@@ -0,0 +1,148 @@
+"""Projection of the period sums of every meter to the end of the period."""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .platform import NudgePeriod, get_start_time
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+# Days ahead the fitted model predicts, enough for the end of any period.
+FORECAST_HORIZON_DAYS = 368
+# Closed days a meter needs before it is fitted, before that it runs at its rate.
+MIN_FIT_DAYS = 14
+# Closed days a meter needs before the model also fits the season of the year.
+SEASONAL_FIT_DAYS = 300
+DAYS_PER_YEAR = 365.2425
+
+
+def get_end_time(nudge_period: NudgePeriod, now: datetime) -> datetime:
+    """Return the start of the next period."""
+    start_time = get_start_time(nudge_period, now)
+    if nudge_period == NudgePeriod.Daily:
+        return start_time + timedelta(days=1)
+    if nudge_period == NudgePeriod.Weekly:
+        return start_time + timedelta(days=7)
+    if nudge_period == NudgePeriod.Monthly:
+        if start_time.month == 12:  # noqa: PLR2004
+            return start_time.replace(year=start_time.year + 1, month=1)
+        return start_time.replace(month=start_time.month + 1)
+    return start_time.replace(year=start_time.year + 1)
+
+
+def design_matrix(ordinals: np.ndarray, *, seasonal: bool) -> np.ndarray:
+    """Return the level, the weekdays and optionally the season of some days."""
+    weekdays = (ordinals - 1) % 7
+    columns = [np.ones(ordinals.size)]
+    # Sunday is the level, every other weekday gets its own offset.
+    columns.extend((weekdays == weekday).astype(float) for weekday in range(6))
+    if seasonal:
+        angle = 2 * np.pi * ordinals / DAYS_PER_YEAR
+        columns.extend((np.sin(angle), np.cos(angle)))
+    return np.column_stack(columns)
+
+
+@dataclass(frozen=True)
+class FittedForecast:
+    """Predicted daily values of every meter from the day of the fit on."""
+
+    fitted_on: date
+    # Predicted sum of the first k days from the day of the fit at index k.
+    cumulative: dict[str, np.ndarray]
+
+
+class ForecastModel:
+    """
+    Fit a day of week and season model to the cached daily history of meters.
+
+    The model is fitted at most once a day with least squares and predicts
+    the days until the end of the longest period at once. A projection only
+    looks up the cumulative predictions, so it runs on every update.
+    Meters without enough history are projected with their rate so far.
+    """
+
+    def __init__(self) -> None:
+        """Set up a model that has not been fitted."""
+        self._lock = threading.Lock()
+        self._fitted: FittedForecast | None = None
+
+    @property
+    def fitted_on(self) -> date | None:
+        """Return the day of the last fit."""
+        return self._fitted.fitted_on if self._fitted else None
+
+    def is_fitted(self, today: date, statistic_ids: set[str]) -> bool:
+        """Return True if the model was fitted today for all statistic IDs."""
+        fitted = self._fitted
+        return (
+            fitted is not None
+            and fitted.fitted_on == today
+            and statistic_ids <= fitted.cumulative.keys()
+        )
+
+    def fit(
+        self, first_day: date, series: Mapping[str, np.ndarray], today: date
+    ) -> None:
+        """Fit every meter to its closed days, run in the executor."""
+        future = design_matrix(
+            today.toordinal() + np.arange(FORECAST_HORIZON_DAYS), seasonal=True
+        )
+        cumulative: dict[str, np.ndarray] = {}
+        for statistic_id, values in series.items():
+            # Days before the first recorded value precede the meter.
+            recorded = np.flatnonzero(values)
+            if recorded.size == 0 or values.size - recorded[0] < MIN_FIT_DAYS:
+                continue
+            history = values[recorded[0] :]
+            seasonal = history.size >= SEASONAL_FIT_DAYS
+            ordinals = first_day.toordinal() + recorded[0] + np.arange(history.size)
+            coefficients, *_ = np.linalg.lstsq(
+                design_matrix(ordinals, seasonal=seasonal), history, rcond=None
+            )
+            columns = coefficients.size
+            predicted = np.clip(future[:, :columns] @ coefficients, 0, None)
+            cumulative[statistic_id] = np.concatenate(([0.0], np.cumsum(predicted)))
+        with self._lock:
+            self._fitted = FittedForecast(today, cumulative)
+
+    def project(
+        self,
+        nudge_period: NudgePeriod,
+        period_sums: Mapping[str, float],
+        now: datetime,
+    ) -> dict[str, float]:
+        """Return the period sums projected to the end of the period."""
+        start_time = get_start_time(nudge_period, now)
+        today = get_start_time(NudgePeriod.Daily, now)
+        rest_of_today = 1 - (now - today) / timedelta(days=1)
+        full_days = (get_end_time(nudge_period, now).date() - today.date()).days - 1
+        elapsed_days = (now - start_time) / timedelta(days=1)
+        fitted = self._fitted
+        offset = (today.date() - fitted.fitted_on).days if fitted else -1
+
+        projected: dict[str, float] = {}
+        for statistic_id, value in period_sums.items():
+            cumulative = fitted.cumulative.get(statistic_id) if fitted else None
+            if (
+                cumulative is None
+                or offset < 0
+                or offset + full_days + 1 >= cumulative.size
+            ):
+                rate = value / elapsed_days if elapsed_days > 0 else 0.0
+                projected[statistic_id] = value + rate * (rest_of_today + full_days)
+                continue
+            tomorrow = offset + 1
+            projected[statistic_id] = float(
+                value
+                + (cumulative[tomorrow] - cumulative[offset]) * rest_of_today
+                + cumulative[tomorrow + full_days]
+                - cumulative[tomorrow]
+            )
+        return projected
@@ -0,0 +1,216 @@
+"""Persistent daily outcomes and streaks of the Nudges of a household."""
+
+from __future__ import annotations
+
+from base64 import b64decode, b64encode
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .backfill import DailyHistory, summarize_days
+from .const import DOMAIN_NUDGE_HOUSEHOLD
+from .platform import NudgePeriod, NudgeType, get_start_time
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+STORAGE_VERSION = 1
+# Seconds to collect changes before the history is written, so a settlement
+# of all Nudge Types and the streaks it moves end up in one write.
+SAVE_DELAY = 30
+
+
+def pack_bits(bits: np.ndarray) -> str:
+    """Return a bool array as packed bits in base64."""
+    return b64encode(np.packbits(bits).tobytes()).decode()
+
+
+def unpack_bits(packed: str, days: int) -> np.ndarray:
+    """Return a bool array of some days from packed bits in base64."""
+    raw = np.frombuffer(b64decode(packed), dtype=np.uint8)
+    return np.unpackbits(raw, count=days).astype(bool)
+
+
+@dataclass
+class Outcomes:
+    """Reached and settled days of one Nudge Type from its first day on."""
+
+    first_day: date
+    reached: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    settled: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    streak: int = 0
+    best_streak: int = 0
+
+    def cover(self, first_day: date, days: int) -> int:
+        """Grow the bitsets over some days from a day on, return its index."""
+        start = min(self.first_day, first_day)
+        end = max(
+            self.first_day + timedelta(days=self.reached.size),
+            first_day + timedelta(days=days),
+        )
+        front = (self.first_day - start).days
+        size = (end - start).days
+        if size != self.reached.size:
+            for name in ("reached", "settled"):
+                bits = np.zeros(size, dtype=bool)
+                old = getattr(self, name)
+                bits[front : front + old.size] = old
+                setattr(self, name, bits)
+            self.first_day = start
+        return (first_day - start).days
+
+    def window(self, start: date, end: date) -> np.ndarray:
+        """Return the reached days from start until before end."""
+        first = max((start - self.first_day).days, 0)
+        last = min((end - self.first_day).days, self.reached.size)
+        return self.reached[first:last] if first < last else self.reached[:0]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the outcomes for the storage."""
+        return {
+            "first_day": self.first_day.isoformat(),
+            "days": int(self.reached.size),
+            "reached": pack_bits(self.reached),
+            "settled": pack_bits(self.settled),
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> Outcomes:
+        """Return the outcomes from the storage."""
+        days = data["days"]
+        return cls(
+            first_day=date.fromisoformat(data["first_day"]),
+            reached=unpack_bits(data["reached"], days),
+            settled=unpack_bits(data["settled"], days),
+            streak=data["streak"],
+            best_streak=data["best_streak"],
+        )
+
+
+class ScoreHistory:
+    """
+    Keep the daily outcomes and the streaks of a household in the storage.
+
+    Every Nudge Type has a bitset of reached and one of settled days. Changes
+    are saved with a delay, so a settlement costs one write no matter how many
+    Nudge Types and streaks it touches. Points and streaks of any window are
+    counted on a slice of the bitsets.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Set up an empty history of a config entry."""
+        self.hass = hass
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN_NUDGE_HOUSEHOLD}.history.{entry_id}"
+        )
+        self._outcomes: dict[NudgeType, Outcomes] = {}
+
+    async def async_load(self) -> None:
+        """Read the history from the storage."""
+        data = await self._store.async_load() or {}
+        self._outcomes = {
+            NudgeType[name]: Outcomes.from_dict(outcomes)
+            for name, outcomes in data.get("outcomes", {}).items()
+            if name in NudgeType.__members__
+        }
+
+    async def async_remove(self) -> None:
+        """Delete the history from the storage."""
+        await self._store.async_remove()
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the whole history for the storage."""
+        return {
+            "outcomes": {
+                nudge_type.name: outcomes.as_dict()
+                for nudge_type, outcomes in self._outcomes.items()
+            }
+        }
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        """Write the history after the save delay."""
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def _outcomes_of(self, nudge_type: NudgeType, first_day: date) -> Outcomes:
+        """Return the outcomes of a Nudge Type, starting them at a day if new."""
+        if (outcomes := self._outcomes.get(nudge_type)) is None:
+            outcomes = self._outcomes[nudge_type] = Outcomes(first_day)
+        return outcomes
+
+    @callback
+    def async_record(self, day: date, results: Mapping[NudgeType, bool]) -> None:
+        """Record whether the Nudges reached their goals on a day."""
+        for nudge_type, goal_reached in results.items():
+            outcomes = self._outcomes_of(nudge_type, day)
+            index = outcomes.cover(day, 1)
+            outcomes.reached[index] = goal_reached
+            outcomes.settled[index] = True
+        if results:
+            self._async_schedule_save()
+
+    @callback
+    def async_seed(
+        self,
+        nudge_type: NudgeType,
+        first_day: date,
+        reached: np.ndarray,
+        settled: np.ndarray,
+    ) -> None:
+        """Add the outcomes of past days, settled days are kept."""
+        outcomes = self._outcomes_of(nudge_type, first_day)
+        index = outcomes.cover(first_day, reached.size)
+        days = slice(index, index + reached.size)
+        unsettled = ~outcomes.settled[days] & settled
+        outcomes.reached[days] = np.where(unsettled, reached, outcomes.reached[days])
+        outcomes.settled[days] |= settled
+        self._async_schedule_save()
+
+    @callback
+    def async_set_streaks(
+        self, nudge_type: NudgeType, streak: int, best_streak: int
+    ) -> None:
+        """Keep the current and the best streak of a Nudge Type."""
+        outcomes = self._outcomes_of(nudge_type, dt_util.now().date())
+        if (outcomes.streak, outcomes.best_streak) == (streak, best_streak):
+            return
+        outcomes.streak = streak
+        outcomes.best_streak = best_streak
+        self._async_schedule_save()
+
+    def streaks(self, nudge_type: NudgeType) -> tuple[int, int] | None:
+        """Return the current and the best streak, None without a history."""
+        if (outcomes := self._outcomes.get(nudge_type)) is None:
+            return None
+        return outcomes.streak, outcomes.best_streak
+
+    def summarize(self, nudge_type: NudgeType, start: date, end: date) -> DailyHistory:
+        """Return the points and streaks of the days from start until before end."""
+        if (outcomes := self._outcomes.get(nudge_type)) is None:
+            return DailyHistory(points=0, streak=0, best_streak=0)
+        return summarize_days(outcomes.window(start, end), 0)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a summary of every Nudge Type for the diagnostics."""
+        today = dt_util.now().date()
+        this_year = get_start_time(NudgePeriod.Yearly).date()
+        return {
+            nudge_type.name: {
+                "first_day": outcomes.first_day.isoformat(),
+                "settled_days": int(np.count_nonzero(outcomes.settled)),
+                "points_this_year": self.summarize(
+                    nudge_type, this_year, today + timedelta(days=1)
+                ).points,
+                "streak": outcomes.streak,
+                "best_streak": outcomes.best_streak,
+            }
+            for nudge_type, outcomes in self._outcomes.items()
+        }
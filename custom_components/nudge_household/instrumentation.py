@@ -0,0 +1,155 @@
+"""Opt-in counters and latency histograms of the hot paths of a household."""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Any
+
+# Upper bounds of the latency buckets in seconds, the last bucket is open.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+CACHE_DEVICE_ENTITIES = "device_entities"
+CACHE_RESOLVER = "resolver"
+CACHE_DAILY_SERIES = "daily_series"
+CACHE_SHARED_FETCH = "shared_fetch"
+
+# Counters are grouped by the prefix of their name.
+COUNTER_CALLS = "calls:"
+COUNTER_QUERIES = "queries:"
+COUNTER_STATE_WRITES = "state_writes:"
+
+HISTOGRAM_ENTITY_UPDATE = "entity_update"
+HISTOGRAM_RECORDER_JOB = "recorder_job"
+
+
+class Histogram:
+    """Count durations in fixed latency buckets."""
+
+    def __init__(self) -> None:
+        """Set up empty buckets."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add a duration."""
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def merge(self, other: Histogram) -> None:
+        """Add the durations of another histogram."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts, strict=True)]
+        self.total += other.total
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the buckets with the mean duration in milliseconds."""
+        count = sum(self.counts)
+        labels = [f"<={bound * 1000:g}ms" for bound in LATENCY_BUCKETS]
+        labels.append(f">{LATENCY_BUCKETS[-1] * 1000:g}ms")
+        return {
+            "count": count,
+            "mean_ms": self.total * 1000 / count if count else 0.0,
+            "buckets": dict(zip(labels, self.counts, strict=True)),
+        }
+
+
+class Instrumentation:
+    """
+    Collect what the integration costs at runtime for one config entry.
+
+    Every method returns at once when instrumentation is disabled, so the hot
+    paths only pay for one attribute lookup. The recorder executor reports
+    into the same object, so changes are made under a lock.
+    """
+
+    def __init__(self, *, enabled: bool) -> None:
+        """Set up empty counters."""
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Counter[str] = Counter()
+        self._caches: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+        self._histograms: dict[str, dict[str, Histogram]] = defaultdict(
+            lambda: defaultdict(Histogram)
+        )
+
+    def start(self) -> float | None:
+        """Return the start of a measured duration, None when disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def observe(self, histogram: str, key: str, started: float | None) -> None:
+        """Add the duration since start to a histogram."""
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._histograms[histogram][key].observe(seconds)
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        """Increase a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[counter] += amount
+
+    def cache(self, cache: str, *, hit: bool) -> None:
+        """Count a hit or a miss of a cache."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._caches[cache][0 if hit else 1] += 1
+
+    def cache_hit_rate(self) -> float | None:
+        """Return the share of hits over all caches, None without lookups."""
+        with self._lock:
+            hits = sum(hits for hits, _ in self._caches.values())
+            lookups = hits + sum(misses for _, misses in self._caches.values())
+        return hits / lookups if lookups else None
+
+    def histogram_totals(self, histogram: str) -> dict[str, Any]:
+        """Return all durations of a histogram merged into one."""
+        merged = Histogram()
+        with self._lock:
+            for single in self._histograms[histogram].values():
+                merged.merge(single)
+        return merged.as_dict()
+
+    def histograms(self, histogram: str) -> dict[str, dict[str, Any]]:
+        """Return the durations of a histogram per key."""
+        with self._lock:
+            return {
+                key: single.as_dict()
+                for key, single in self._histograms[histogram].items()
+            }
+
+    def counters(self, prefix: str) -> dict[str, int]:
+        """Return the counters whose name starts with a prefix, without it."""
+        with self._lock:
+            return {
+                name.removeprefix(prefix): value
+                for name, value in self._counters.items()
+                if name.startswith(prefix)
+            }
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return everything that was collected."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "counters": dict(self._counters),
+                "caches": {
+                    cache: {
+                        "hits": hits,
+                        "misses": misses,
+                        "hit_rate": hits / (hits + misses) if hits + misses else None,
+                    }
+                    for cache, (hits, misses) in self._caches.items()
+                },
+                "histograms": {
+                    histogram: {
+                        key: single.as_dict() for key, single in histograms.items()
+                    }
+                    for histogram, histograms in self._histograms.items()
+                },
+            }
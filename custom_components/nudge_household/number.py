@@ -15,6 +15,7 @@ from .const import (
     CONF_NAME_HOUSEHOLD,
     CONF_AUTARKY_GOAL,
     CONF_BUDGET_YEARLY_HEAT,
+    CONF_BUDGET_YEARLY_WATER,
     CONF_BUDGET_YEARLY_ELECTRICITY,
     DOMAIN_NUDGE_HOUSEHOLD,
     MyConfigEntry,
@@ -55,38 +56,40 @@ async def async_setup_entry(
     if heat_budget_goal:
         nudge_types.add(NudgeType.HEAT_BUDGET)
 
-    water_budget_goal = config_entry.data.get(CONF_BUDGET_YEARLY_HEAT)
+    water_budget_goal = config_entry.data.get(CONF_BUDGET_YEARLY_WATER)
     if water_budget_goal:
         nudge_types.add(NudgeType.WATER_BUDGET)
 
     entry_id = config_entry.entry_id
+    scoreboard = config_entry.runtime_data.scoreboard
     for nudge_type in nudge_types:
         streak = Streak(
             nudge_type=nudge_type,
             entry_id=config_entry.entry_id,
             device_info=device_info,
+            instrumentation=config_entry.runtime_data.instrumentation,
+            history=config_entry.runtime_data.history,
         )
         entities.add(streak)
         entity = Score(
             entry_id=entry_id,
             nudge_type=nudge_type,
             device_info=device_info,
-            streak=streak,
-            domain=DOMAIN_NUDGE_HOUSEHOLD
+            scoreboard=scoreboard,
         )
+        scoreboard.async_add_score(entity, streak)
         score_device_unique_ids[nudge_type] = entity.get_unique_id()
         entities.add(entity)
     register_services()
 
-    config_entry.runtime_data.score_device_unique_ids = score_device_unique_ids
-
-    entities.add(
-        TotalScore(
-            entity_uuids_scores=score_device_unique_ids,
-            domain=DOMAIN_NUDGE_HOUSEHOLD,
-            device_info=device_info,
-            entry_id=entry_id,
-        )
+    total_score = TotalScore(
+        entity_uuids_scores=score_device_unique_ids,
+        entry_id=entry_id,
+        resolver=config_entry.runtime_data.resolver,
+        device_info=device_info,
+        instrumentation=config_entry.runtime_data.instrumentation,
     )
+    scoreboard.async_set_total_score(total_score)
+    entities.add(total_score)
 
     async_add_entities(entities)
@@ -1,40 +1,73 @@
 """Plattform for building Nudge Apps."""
 
+from __future__ import annotations
+
+import asyncio
 import logging
+from abc import abstractmethod
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum, auto
-from typing import Final
+from typing import TYPE_CHECKING, Final, Literal
 
-import homeassistant.components.energy.data as energydata
+import numpy as np
 import voluptuous as vol
 from homeassistant.components.number import NumberEntity, NumberMode, RestoreNumber
 from homeassistant.components.number.const import NumberDeviceClass
-from homeassistant.components.recorder.statistics import (
-    statistics_during_period,
-)
-from homeassistant.components.recorder.util import get_instance
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.components.sensor.const import SensorStateClass
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN, Platform
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    Event,
+    EventStateChangedData,
+    HomeAssistant,
+    State,
+    callback,
+)
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers import entity_platform, entity_registry
-from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.device_registry import (
+    EVENT_DEVICE_REGISTRY_UPDATED,
+    DeviceInfo,
+)
 from homeassistant.helpers.device_registry import (
     async_get as async_get_device_registry,
 )
 from homeassistant.helpers.entity_registry import (
-    EntityRegistry,
+    EVENT_ENTITY_REGISTRY_UPDATED,
+    async_entries_for_device,
 )
 from homeassistant.helpers.entity_registry import (
     async_get as async_get_entity_registry,
 )
 from homeassistant.helpers.event import (
     async_track_point_in_time,
-    async_track_time_change,
+    async_track_state_change_event,
 )
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
+from .instrumentation import (
+    CACHE_DEVICE_ENTITIES,
+    COUNTER_CALLS,
+    COUNTER_STATE_WRITES,
+    HISTOGRAM_ENTITY_UPDATE,
+    Instrumentation,
+)
+from .ranking import RankingEngine, async_get_ranking_engine
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from datetime import date
+
+    import homeassistant.components.energy.data as energydata
+
+    from .coordinator import NudgeStatisticsCoordinator
+    from .history import ScoreHistory
+    from .resolver import UniqueIdResolver
+    from .scoreboard import Scoreboard
+
 _LOGGER = logging.getLogger(__name__)
 
 CONF_CHOOSE_ACTION = "action"
@@ -104,131 +137,268 @@ def get_entity_from_uuid(hass:HomeAssistant, uuid:str, domain:str,
     return er.async_get_entity_id(platform=domain,domain=platform,unique_id=uuid)
 
 
-def get_start_time(nudge_period: NudgePeriod) -> datetime:
+def get_start_time(nudge_period: NudgePeriod, now: datetime | None = None) -> datetime:
     """Return the start time for a given Nudge Persiod."""
-    now = dt_util.now()
-    if nudge_period == NudgePeriod.Daily:
-        start_time = now
+    if now is None:
+        now = dt_util.now()
+    start_time = now
     if nudge_period == NudgePeriod.Weekly:
         start_time = now - timedelta(
             days=now.weekday()
         )  # Zurück zum Wochenanfang (Montag)
     elif nudge_period == NudgePeriod.Monthly:
-        start_time = now
-        start_time.replace(day=1)
+        start_time = now.replace(day=1)
     elif nudge_period == NudgePeriod.Yearly:
-        start_time = now
-        start_time.replace(day=1, month=1)
+        start_time = now.replace(day=1, month=1)
 
     return start_time.replace(
         hour=0, minute=0, second=0, microsecond=0
     )  # Zeit auf 00:00 Uhr setzen
 
 
-async def get_energy_entities(
-    hass: HomeAssistant,
-) -> tuple[dict[EnergyElectricDevices, str], str | None, str | None]:
-    """Return the different Entities from the Energy Manager."""
-    energy_manager = await energydata.async_get_manager(hass)
-
-    energy_manager_data: energydata.EnergyPreferences | None = energy_manager.data
-    energy_entities = {}
-    gas = None
-    water = None
-    if energy_manager_data:
-        energy_sources = energy_manager_data.get("energy_sources", [])
+ENERGY_SOURCE_NUDGE_TYPES: Final = {
+    "grid": NudgeType.ELECTRICITY_BUDGET,
+    "gas": NudgeType.HEAT_BUDGET,
+    "solar": NudgeType.AUTARKY_GOAL,
+    "water": NudgeType.WATER_BUDGET,
+}
+
+
+type EnergyEntities = dict[EnergyElectricDevices, tuple[str, ...]]
+
+
+@dataclass(frozen=True)
+class EnergyTopology:
+    """The sources of the Energy Manager the Nudges are calculated from."""
+
+    energy_entities: EnergyEntities = field(default_factory=dict)
+    gas: tuple[str, ...] = ()
+    water: tuple[str, ...] = ()
+    source_types: frozenset[str] = frozenset()
+
+    @classmethod
+    def from_preferences(
+        cls, energy_manager_data: energydata.EnergyPreferences | None
+    ) -> EnergyTopology:
+        """Return the Entities of every meter from the Energy Manager."""
+        energy_entities: dict[EnergyElectricDevices, list[str]] = {}
+        gas = []
+        water = []
+        energy_sources = (
+            energy_manager_data.get("energy_sources", []) if energy_manager_data else []
+        )
+
+        def add(device: EnergyElectricDevices, statistic_id: str | None) -> None:
+            if statistic_id:
+                energy_entities.setdefault(device, []).append(statistic_id)
+
         for source in energy_sources:
             if source["type"] == "grid":
-                grid_imports = source.get("flow_from")
-                for grid_import in grid_imports:
-                    energy_entities[EnergyElectricDevices.GridImport] = grid_import[
-                        "stat_energy_from"
-                    ]
-                grid_exports = source.get("flow_to")
-                for grid_export in grid_exports:
-                    energy_entities[EnergyElectricDevices.GridExport] = grid_export[
-                        "stat_energy_to"
-                    ]
+                for grid_import in source.get("flow_from", []):
+                    add(
+                        EnergyElectricDevices.GridImport,
+                        grid_import["stat_energy_from"],
+                    )
+                for grid_export in source.get("flow_to", []):
+                    add(EnergyElectricDevices.GridExport, grid_export["stat_energy_to"])
             elif source["type"] == "battery":
-                energy_entities[EnergyElectricDevices.BATTERY_EXPORT] = source.get(
-                    "stat_energy_to"
-                )
-                energy_entities[EnergyElectricDevices.BatteryImport] = source.get(
-                    "stat_energy_from"
-                )
+                add(EnergyElectricDevices.BATTERY_EXPORT, source.get("stat_energy_to"))
+                add(EnergyElectricDevices.BatteryImport, source.get("stat_energy_from"))
             elif source["type"] == "solar":
-                energy_entities[EnergyElectricDevices.SolarProduction] = source.get(
-                    "stat_energy_from"
+                add(
+                    EnergyElectricDevices.SolarProduction,
+                    source.get("stat_energy_from"),
                 )
-            elif source["type"] == "gas":
-                gas = source.get("stat_energy_from")
-            elif source["type"] == "water":
-                water = source.get("stat_energy_from")
-    return energy_entities, gas, water
-
-
-async def get_long_term_statistics(
-    statistic_ids: set[str], period: NudgePeriod, hass: HomeAssistant
-) -> dict[str, float]:
-    """Return the sum of a set of sensors from the long-term statistics."""
-    statistics_period = {
-        NudgePeriod.Daily: "day",
-        NudgePeriod.Weekly: "week",
-        NudgePeriod.Monthly: "month",
-        NudgePeriod.Yearly: "month",
-    }
+            elif source["type"] == "gas" and source.get("stat_energy_from"):
+                gas.append(source["stat_energy_from"])
+            elif source["type"] == "water" and source.get("stat_energy_from"):
+                water.append(source["stat_energy_from"])
+        return cls(
+            energy_entities={
+                device: tuple(statistic_ids)
+                for device, statistic_ids in energy_entities.items()
+            },
+            gas=tuple(gas),
+            water=tuple(water),
+            source_types=frozenset(source["type"] for source in energy_sources),
+        )
+
+    @classmethod
+    def from_meters(
+        cls,
+        *,
+        grid_import: Sequence[str] = (),
+        grid_export: Sequence[str] = (),
+        solar: Sequence[str] = (),
+        gas: Sequence[str] = (),
+        water: Sequence[str] = (),
+    ) -> EnergyTopology:
+        """Return the topology of a household with its own sub meters."""
+        energy_entities = {
+            device: tuple(statistic_ids)
+            for device, statistic_ids in (
+                (EnergyElectricDevices.GridImport, grid_import),
+                (EnergyElectricDevices.GridExport, grid_export),
+                (EnergyElectricDevices.SolarProduction, solar),
+            )
+            if statistic_ids
+        }
+        source_types = {
+            source_type
+            for source_type, statistic_ids in (
+                ("grid", grid_import),
+                ("solar", solar),
+                ("gas", gas),
+                ("water", water),
+            )
+            if statistic_ids
+        }
+        return cls(
+            energy_entities=energy_entities,
+            gas=tuple(gas),
+            water=tuple(water),
+            source_types=frozenset(source_types),
+        )
+
+    @property
+    def supported_nudge_types(self) -> set[NudgeType]:
+        """Return the Nudge Types the configured sources allow."""
+        return {
+            ENERGY_SOURCE_NUDGE_TYPES[source_type]
+            for source_type in self.source_types
+            if source_type in ENERGY_SOURCE_NUDGE_TYPES
+        }
+
+    def statistic_ids(self, nudge_type: NudgeType) -> set[str]:
+        """Return the statistic IDs a Nudge Type is calculated from."""
+        if nudge_type in (NudgeType.AUTARKY_GOAL, NudgeType.ELECTRICITY_BUDGET):
+            return get_energy_statistic_ids(self.energy_entities)
+        if nudge_type == NudgeType.HEAT_BUDGET:
+            return set(self.gas)
+        if nudge_type == NudgeType.WATER_BUDGET:
+            return set(self.water)
+        return set()
+
+    def changed_nudge_types(self, other: EnergyTopology) -> set[NudgeType]:
+        """Return the Nudge Types whose sources differ in the other topology."""
+        return {
+            nudge_type
+            for nudge_type in NudgeType
+            if self.statistic_ids(nudge_type) != other.statistic_ids(nudge_type)
+        }
+
+
+STATISTIC_TYPE_CHANGE: Final = "change"
+STATISTIC_TYPE_STATE: Final = "state"
 
-    statistic_period = statistics_period[period]
-    start_time = get_start_time(period)
-    end_time = None
-    units = None
 
-    type_statistic: Final = "change"
-    stats = await get_instance(hass=hass).async_add_executor_job(
-        statistics_during_period,
+def fetch_statistic_changes(
+    hass: HomeAssistant,
+    start_time: datetime,
+    end_time: datetime,
+    statistic_ids: set[str],
+    period: Literal["day", "month"] = "day",
+) -> dict[str, list[tuple[date, float]]]:
+    """Return the change of every day or month before end, run in the executor."""
+    from homeassistant.components.recorder.statistics import statistics_during_period
+
+    # The recorder extends the end to the end of its day or month, and counts
+    # the change of the first period from the start of that day or month.
+    stats = statistics_during_period(
         hass,
         start_time,
-        end_time,
+        end_time - timedelta(days=1),
         statistic_ids,
-        statistic_period,
-        units,
-        {type_statistic},
+        period,
+        None,
+        {STATISTIC_TYPE_CHANGE},
     )
-    sum_budget = 0.0
-    for entity in stats.values():
-        for stat in entity:
-            sum_value = stat.get(type_statistic)
-            if sum_value is not None:
-                sum_budget += sum_value
-    entities_sum = {}
-    for entity, values in stats.items():
-        sum_entity = 0.0
-        for stat in values:
-            sum_value = stat.get(type_statistic)
-            if sum_value is not None:
-                sum_entity += sum_value
-        entities_sum[entity] = sum_entity
-
-    return entities_sum
-
-
-async def get_own_total_consumtion(
-    energy_entities: dict[EnergyElectricDevices, str],
-    period: NudgePeriod,
-    hass: HomeAssistant,
+    return {
+        statistic_id: [
+            (
+                dt_util.as_local(dt_util.utc_from_timestamp(row["start"])).date(),
+                row.get(STATISTIC_TYPE_CHANGE) or 0.0,
+            )
+            for row in rows
+        ]
+        for statistic_id, rows in stats.items()
+    }
+
+
+def fetch_period_totals(
+    hass: HomeAssistant, requested: dict[NudgePeriod, set[str]]
+) -> dict[NudgePeriod, dict[str, float]]:
+    """Return the sums aggregated by the database, run in the recorder executor."""
+    from homeassistant.components.recorder.statistics import statistic_during_period
+
+    now = dt_util.now()
+    totals: dict[NudgePeriod, dict[str, float]] = {}
+    for period, statistic_ids in requested.items():
+        if not statistic_ids:
+            continue
+        start_time = get_start_time(period, now)
+        totals[period] = {
+            statistic_id: statistic_during_period(
+                hass, start_time, None, statistic_id, {STATISTIC_TYPE_CHANGE}, None
+            ).get(STATISTIC_TYPE_CHANGE)
+            or 0.0
+            for statistic_id in statistic_ids
+        }
+    return totals
+
+
+def get_energy_statistic_ids(energy_entities: EnergyEntities) -> set[str]:
+    """Return the statistic IDs of all meters of the household."""
+    return {
+        statistic_id
+        for statistic_ids in energy_entities.values()
+        for statistic_id in statistic_ids
+    }
+
+
+def sum_energy_values(
+    energy_entities: EnergyEntities, stats: dict[str, float]
+) -> dict[EnergyElectricDevices, float]:
+    """Return the summed statistics of all meters per device class."""
+    devices = list(EnergyElectricDevices)
+    groups = [
+        devices.index(device)
+        for device, statistic_ids in energy_entities.items()
+        for _ in statistic_ids
+    ]
+    values = [
+        stats.get(statistic_id, 0.0)
+        for statistic_ids in energy_entities.values()
+        for statistic_id in statistic_ids
+    ]
+    sums = np.bincount(groups, weights=values, minlength=len(devices))
+    return {device: float(sums[index]) for index, device in enumerate(devices)}
+
+
+def sum_energy_series(
+    energy_entities: EnergyEntities, series: dict[str, np.ndarray], days: int
+) -> dict[EnergyElectricDevices, np.ndarray]:
+    """Return the summed daily series of all meters per device class."""
+    sums = {device: np.zeros(days) for device in EnergyElectricDevices}
+    for device, statistic_ids in energy_entities.items():
+        for statistic_id in statistic_ids:
+            if statistic_id in series:
+                sums[device] += series[statistic_id]
+    return sums
+
+
+def calculate_own_total_consumtion(
+    energy_entities: EnergyEntities,
+    stats: dict[str, float],
 ) -> tuple[float, float]:
     """Return the own consumtion and the total consumtion of the household."""
-    statistic_ids = set(energy_entities.values())
-    entities_energy = {value: key for key, value in energy_entities.items()}
+    return split_own_total_consumtion(sum_energy_values(energy_entities, stats))
 
-    stats = await get_long_term_statistics(
-        statistic_ids=statistic_ids, period=period, hass=hass
-    )
-    energy_values = {device: 0.0 for device in EnergyElectricDevices}
-
-    for entity, value in stats.items():
-        energy_values[entities_energy[entity]] += value
 
+def split_own_total_consumtion[T: (float, np.ndarray)](
+    energy_values: dict[EnergyElectricDevices, T],
+) -> tuple[T, T]:
+    """Return the own and the total consumtion of single values or daily series."""
     # Degree of self-sufficiency (%) = (self-consumption (kWh) /
     # total consumption (kWh)) * 100
 
@@ -248,11 +418,11 @@ async def get_own_total_consumtion(
     return own_consumption, total_consumption
 
 
-class Nudge(SensorEntity):
+class Nudge(CoordinatorEntity, SensorEntity):
     """Base Class for Budgets and Goals."""
 
     _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_should_poll = True
+    coordinator: NudgeStatisticsCoordinator
 
     def __init__(  # noqa: D107, PLR0913
         self,
@@ -261,40 +431,141 @@ class Nudge(SensorEntity):
         attr_name: str,
         nudge_period: NudgePeriod,
         goal: float,
-        score_entity: str | None,
         nudge_type: NudgeType,
         domain: str,
+        coordinator: NudgeStatisticsCoordinator,
     ) -> None:
-        super().__init__()
+        super().__init__(coordinator)
         self._attr_unique_id = f"{entry_id}_{nudge_period.name}"
         self._nudge_period = nudge_period
         self._attr_name = attr_name
         self._attr_device_info = device_info
         self._goal = goal
         self._last_update = datetime.now(tz=dt_util.DEFAULT_TIME_ZONE)
-        self._score_entity = score_entity
         self._goal_reached = False
         self._attr_icon = NUDGE_ICONS[nudge_type]
+        self._nudge_type = nudge_type
         self._domain = domain
+        self._last_stats: dict[str, float] | None = None
+        self._unregister_statistics: CALLBACK_TYPE | None = None
+
+    @property
+    def statistic_ids(self) -> set[str]:
+        """Return the statistic IDs the Nudge is calculated from."""
+        return set()
+
+    @abstractmethod
+    def set_sources(self, topology: EnergyTopology) -> None:
+        """Take the sources of the Nudge from the energy topology."""
+
+    @callback
+    def async_apply_topology(self, topology: EnergyTopology) -> None:
+        """Recalculate the Nudge from changed sources without a reload."""
+        statistic_ids = self.statistic_ids
+        self.set_sources(topology)
+        if self.statistic_ids == statistic_ids or self.hass is None:
+            return
+        self._async_register_statistics()
+        self._last_stats = None
+        self.hass.async_create_task(self.coordinator.async_request_refresh())
+
+    @property
+    def nudge_type(self) -> NudgeType:
+        """Return the type of the Nudge."""
+        return self._nudge_type
+
+    @property
+    def nudge_period(self) -> NudgePeriod:
+        """Return the period of the Nudge."""
+        return self._nudge_period
+
+    @property
+    def goal_reached(self) -> bool:
+        """Return if the goal of the Nudge is reached at the moment."""
+        return self._goal_reached
+
+    @property
+    def goal(self) -> float:
+        """Return the goal of the Nudge for its period."""
+        return self._goal
+
+    @callback
+    def async_set_goal(self, goal: float) -> None:
+        """Replace the goal and recalculate the state from the last statistics."""
+        self._goal = goal
+        self._last_stats = None
+        if self.hass is None:
+            return
+        self._handle_coordinator_update()
+        if self._last_stats is None:
+            # Without statistics yet only the goal changed.
+            self.async_write_ha_state()
 
     async def async_added_to_hass(self) -> None:
-        """Update Points every evening."""
-        if self._nudge_period == NudgePeriod.Daily:
-            async_track_time_change(self.hass, self.send_points_to_user, second=59)
+        """Register the statistics at the coordinator."""
+        await super().async_added_to_hass()
+        self._async_register_statistics()
+        self.async_on_remove(self._async_unregister_statistics)
+        await self.coordinator.async_refresh_when_started()
 
     @callback
-    async def send_points_to_user(self, now: datetime) -> None:  # noqa: ARG002
-        """Service for sending points to a score/user."""
-        if not self._score_entity:
+    def _async_register_statistics(self) -> None:
+        """Replace the statistics of the Nudge at the coordinator."""
+        self._async_unregister_statistics()
+        self._unregister_statistics = self.coordinator.async_register_statistics(
+            self.statistic_ids, self._nudge_period
+        )
+
+    @callback
+    def _async_unregister_statistics(self) -> None:
+        """Remove the statistics of the Nudge from the coordinator."""
+        if self._unregister_statistics:
+            self._unregister_statistics()
+            self._unregister_statistics = None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Update the Nudge from the batched statistics of the coordinator."""
+        if not self.coordinator.data:
             return
-        points = 1 if self._goal_reached else 0
-        if points != 0:
-            await self.hass.services.async_call(
-                domain=self._domain,
-                service=SERVICE_ADD_POINTS_TO_USER,
-                service_data={"goal_reached": self._goal_reached},
-                target={"entity_id": self._score_entity},
-            )
+        stats = self.coordinator.data.get(self._nudge_period)
+        if stats is None:
+            return
+        instrumentation = self.coordinator.instrumentation
+        started = instrumentation.start()
+        own_stats = {
+            statistic_id: value
+            for statistic_id, value in stats.items()
+            if statistic_id in self.statistic_ids
+        }
+        if own_stats == self._last_stats:
+            return
+        self._last_stats = own_stats
+        self.update_from_statistics(stats)
+        self._last_update = datetime.now(tz=dt_util.DEFAULT_TIME_ZONE)
+        self.async_write_ha_state()
+        instrumentation.count(f"{COUNTER_STATE_WRITES}{self._nudge_period.name}")
+        instrumentation.observe(HISTOGRAM_ENTITY_UPDATE, self.entity_id, started)
+
+    @abstractmethod
+    def update_from_statistics(self, stats: dict[str, float]) -> None:
+        """Calculate the state from the summed statistics of the period."""
+
+    @abstractmethod
+    def actual_from_statistics(self, stats: dict[str, float]) -> float:
+        """Return the value the goal is compared with for summed statistics."""
+
+    @abstractmethod
+    def state_for(self, actual: float) -> float:
+        """Return the state of the Nudge for a value compared with the goal."""
+
+    @abstractmethod
+    def goal_reached_for(self, actual: float) -> bool:
+        """Return if a value compared with the goal reaches it."""
+
+    @abstractmethod
+    def evaluate_history(self, series: dict[str, np.ndarray], days: int) -> np.ndarray:
+        """Return for every day of a daily history if the goal was reached."""
 
 
 class Budget(Nudge):
@@ -319,8 +590,8 @@ class Budget(Nudge):
         nudge_type: NudgeType,
         domain: str,
         reduction_goal: int,
-        score_entity: str | None,
-        energy_entities: dict[EnergyElectricDevices, str] | None = None,
+        coordinator: NudgeStatisticsCoordinator,
+        energy_entities: EnergyEntities | None = None,
         budget_entities: set[str] | None = None,
     ) -> None:
         super().__init__(
@@ -329,9 +600,9 @@ class Budget(Nudge):
             attr_name=attr_name,
             nudge_period=nudge_period,
             goal=goal,
-            score_entity=score_entity,
             nudge_type=nudge_type,
             domain=domain,
+            coordinator=coordinator,
         )
         self._attr_unique_id = f"{entry_id}_{nudge_period.name}"
         self._actual = 0.0
@@ -352,36 +623,133 @@ class Budget(Nudge):
 
         return attributes
 
-    async def async_update(self) -> None:
-        """Update the actual value of the budget."""
+    @property
+    def statistic_ids(self) -> set[str]:
+        """Return the statistic IDs the budget is calculated from."""
+        if self._budget_entities:
+            return set(self._budget_entities)
+        if self._energy_entities:
+            return get_energy_statistic_ids(self._energy_entities)
+        return set()
+
+    def set_sources(self, topology: EnergyTopology) -> None:
+        """Take the budget sources from the energy topology."""
+        if self._energy_entities is not None:
+            self._energy_entities = topology.energy_entities
+        else:
+            self._budget_entities = topology.statistic_ids(self.nudge_type)
+
+    def actual_from_statistics(self, stats: dict[str, float]) -> float:
+        """Return the consumption of the budget."""
         sum_budget = 0.0
         if self._budget_entities:
-            stats = await get_long_term_statistics(
-                self._budget_entities, self._nudge_period, self.hass
-            )
-            for value in stats.values():
-                sum_budget += value
+            for entity in self._budget_entities:
+                sum_budget += stats.get(entity, 0.0)
         elif self._energy_entities:
-            own_consumtion, total_consumtion = await get_own_total_consumtion(
-                energy_entities=self._energy_entities,
-                period=self._nudge_period,
-                hass=self.hass,
+            own_consumtion, total_consumtion = calculate_own_total_consumtion(
+                energy_entities=self._energy_entities, stats=stats
             )
             sum_budget = own_consumtion
+        return sum_budget
 
-        self._actual = sum_budget
-        self._goal_reached = self._actual < self._goal
-        self._attr_native_value = round(self._actual / self._goal * 100)
-        self._last_update = datetime.now(tz=dt_util.DEFAULT_TIME_ZONE)
-        self.async_write_ha_state()
+    def state_for(self, actual: float) -> float:
+        """Return the consumption in percent of the goal."""
+        return round(actual / self._goal * 100)
+
+    def goal_reached_for(self, actual: float) -> bool:
+        """Return if the consumption stays within the goal."""
+        return actual < self._goal
+
+    def update_from_statistics(self, stats: dict[str, float]) -> None:
+        """Update the actual value of the budget."""
+        self._actual = self.actual_from_statistics(stats)
+        self._goal_reached = self.goal_reached_for(self._actual)
+        self._attr_native_value = self.state_for(self._actual)
+
+    def evaluate_history(self, series: dict[str, np.ndarray], days: int) -> np.ndarray:
+        """Return for every day of a daily history if it stayed within the goal."""
+        actual = np.zeros(days)
+        if self._budget_entities:
+            for entity in self._budget_entities:
+                if entity in series:
+                    actual += series[entity]
+        elif self._energy_entities:
+            actual, _ = split_own_total_consumtion(
+                sum_energy_series(self._energy_entities, series, days)
+            )
+        return actual < self._goal
+
+    @callback
+    def set_budget_with_history_data(self, yearly_goal: float) -> None:
+        """Split a new yearly goal and take the share of the period."""
+        self.async_set_goal(Budget.calculate_goals(yearly_goal)[self._nudge_period])
+
+
+class NudgeForecast(CoordinatorEntity, SensorEntity):
+    """Projection of a Nudge to the end of its period."""
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_icon = "mdi:chart-timeline-variant"
+    coordinator: NudgeStatisticsCoordinator
+
+    def __init__(self, nudge: Nudge) -> None:
+        """Set up the forecast on the device of its Nudge."""
+        super().__init__(nudge.coordinator)
+        self._nudge = nudge
+        self._attr_unique_id = f"{nudge.unique_id}_forecast"
+        self._attr_name = f"{nudge.name}_forecast"
+        self._attr_device_info = nudge.device_info
+        self._attr_native_unit_of_measurement = "%"
+        self._attr_native_value: float | None = None
+        self._projected = 0.0
+        self._goal_reached = False
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Return the projected value and if it reaches the goal."""
+        return {
+            "projected": self._projected,
+            "goal": self._nudge.goal,
+            "goal_reached": self._goal_reached,
+        }
+
+    async def async_added_to_hass(self) -> None:
+        """Project the statistics the coordinator already has."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
 
     @callback
-    async def set_budget_with_history_data(self) -> bool:
-        """Use the reduction goal for setting a new budget."""
-        self._goal = int(
-            ((100 * self._goal) - (self._reduction_goal * self._goal)) / 100
+    def _handle_coordinator_update(self) -> None:
+        """Project the period sums of the Nudge without another query."""
+        if not self.coordinator.data:
+            return
+        stats = self.coordinator.data.get(self._nudge.nudge_period)
+        if stats is None:
+            return
+        projected = self.coordinator.forecast.project(
+            self._nudge.nudge_period,
+            {
+                statistic_id: stats.get(statistic_id, 0.0)
+                for statistic_id in self._nudge.statistic_ids
+            },
+            dt_util.now(),
         )
-        return True
+        actual = self._nudge.actual_from_statistics(projected)
+        value = round(self._nudge.state_for(actual), 1)
+        projected_actual = round(actual, 2)
+        goal_reached = self._nudge.goal_reached_for(actual)
+        if (value, projected_actual, goal_reached) == (
+            self._attr_native_value,
+            self._projected,
+            self._goal_reached,
+        ):
+            return
+        self._attr_native_value = value
+        self._projected = projected_actual
+        self._goal_reached = goal_reached
+        self.async_write_ha_state()
+        self.coordinator.instrumentation.count(f"{COUNTER_STATE_WRITES}forecast")
+
 
 def register_services() -> None:
     """Register services for the Rank and score system."""
@@ -418,27 +786,75 @@ class Streak(RestoreNumber):
     _attr_name = None
     _attr_mode = NumberMode.BOX
     _attr_native_unit_of_measurement = "days"
+    _attr_should_poll = False
 
     def __init__(
         self,
         nudge_type: NudgeType,
         entry_id: str,
         device_info: DeviceInfo | None = None,
+        instrumentation: Instrumentation | None = None,
+        history: ScoreHistory | None = None,
     ) -> None:
         """Set up the Streak."""
         super().__init__()
+        self._instrumentation = instrumentation or Instrumentation(enabled=False)
+        self._history = history
         self._attr_device_info = device_info
         self._attr_native_value: int = 0
+        self.best_streak = 0
         self.nudge_type = nudge_type
         self._attr_name = f"Streak {nudge_type.name.replace("_"," ").capitalize()}"
         self._attr_unique_id: str = f"{entry_id}_{nudge_type.name}_Streak"
 
-    async def update_streak(self, goal_reached: bool) -> None:  # noqa: FBT001
-        """Calll from Score every evenig, to tell if nudge achieved."""
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Return the longest streak so far."""
+        return {"best_streak": self.best_streak}
+
+    async def async_added_to_hass(self) -> None:
+        """Restore the streaks from the history of the household."""
+        await super().async_added_to_hass()
+        if self._history and (streaks := self._history.streaks(self.nudge_type)):
+            self._attr_native_value, self.best_streak = streaks
+
+    @callback
+    def _async_streaks_changed(self) -> None:
+        """Keep the streaks in the history of the household."""
+        if self._history is not None:
+            self._history.async_set_streaks(
+                self.nudge_type, self._attr_native_value, self.best_streak
+            )
+
+    def apply_result(self, *, goal_reached: bool) -> bool:
+        """Count the day, return True if the streak changed."""
+        previous = self._attr_native_value
         if goal_reached:
             self._attr_native_value += 1
+            self.best_streak = max(self.best_streak, self._attr_native_value)
         else:
             self._attr_native_value = 0
+        if self._attr_native_value == previous:
+            return False
+        self._async_streaks_changed()
+        return True
+
+    def apply_history(self, streak: int, best_streak: int) -> bool:
+        """Take over the streaks of the past days, return True if they changed."""
+        best_streak = max(best_streak, self.best_streak)
+        if (streak, best_streak) == (self._attr_native_value, self.best_streak):
+            return False
+        self._attr_native_value = streak
+        self.best_streak = best_streak
+        self._async_streaks_changed()
+        return True
+
+    async def update_streak(self, goal_reached: bool) -> None:  # noqa: FBT001
+        """Service to tell the streak if the nudge was achieved."""
+        self._instrumentation.count(f"{COUNTER_CALLS}{SERVICE_UPDATE_STREAK}")
+        if self.apply_result(goal_reached=goal_reached):
+            self.async_write_ha_state()
+            self._instrumentation.count(f"{COUNTER_STATE_WRITES}streak")
 
     def get_unique_id(self) -> str:
         """Return the unique ID of the Streak."""
@@ -454,13 +870,13 @@ class Score(RestoreNumber):
     _attr_mode = NumberMode.BOX
     _attr_native_unit_of_measurement = "points"
     _attr_device_class = NumberDeviceClass.AQI
+    _attr_should_poll = False
 
     def __init__(
         self,
         nudge_type: NudgeType,
         entry_id: str,
-        streak: Streak,
-        domain:str,
+        scoreboard: Scoreboard,
         device_info: DeviceInfo | None = None,
     ) -> None:
         """Set up Score Entity."""
@@ -470,34 +886,65 @@ class Score(RestoreNumber):
         self._attr_native_value: int = 0
         self.nudge_type = nudge_type
         self._attr_name = f"Score {nudge_type.name.replace("_"," ").capitalize()}"
-        self._attr_unique_id: str = f"{entry_id}_{nudge_type.name}_Score"
-        self._streak_uuid = streak.get_unique_id()
-        self._streak_entity_id = None
-        self._domain = domain
+        self._attr_unique_id: str = Score.build_unique_id(entry_id, nudge_type)
+        self._scoreboard = scoreboard
+        self._ranking: RankingEngine | None = None
+
+    @staticmethod
+    def build_unique_id(entry_id: str, nudge_type: NudgeType) -> str:
+        """Return the unique id of the score of a Nudge Type."""
+        return f"{entry_id}_{nudge_type.name}_Score"
 
     async def set_ranking_position(
         self, ranking_position: int, ranking_length: int
     ) -> None:
-        """Set ranking position from rank entity."""
+        """Set ranking position until the next change of the standings."""
         self.ranking_position = f"{ranking_position}/{ranking_length}"
 
-    async def add_points_to_score(self, goal_reached: bool) -> None:  # noqa: FBT001
-        """If nudge achieved, then add point to related score."""
+    @callback
+    def _async_points_changed(self) -> None:
+        """Move the score in the ranking of its Nudge Type."""
+        if self._ranking is None:
+            return
+        self._ranking.async_set_points(
+            self.nudge_type, self._attr_unique_id, self._attr_native_value
+        )
+        self.ranking_position = self._ranking.async_position(
+            self.nudge_type, self._attr_unique_id
+        )
+
+    @callback
+    def _async_rank_changed(self) -> None:
+        """Publish the position after the score of another household moved."""
+        if self._ranking is None:
+            return
+        ranking = self._ranking.async_position(self.nudge_type, self._attr_unique_id)
+        if ranking == self.ranking_position:
+            return
+        self.ranking_position = ranking
+        self.async_write_ha_state()
+
+    def apply_result(self, *, goal_reached: bool) -> bool:
+        """Add a point if the nudge was achieved, return True if it changed."""
         if goal_reached:
             self._attr_native_value += 1
-        if not self._streak_entity_id:
-            entity_registry = async_get_entity_registry(self.hass)
-            self._streak_entity_id = entity_registry.async_get_entity_id(
-                platform=self._domain, domain=Platform.NUMBER,
-                unique_id=self._streak_uuid
-            )
+            self._async_points_changed()
+        return goal_reached
+
+    def apply_history(self, points: int) -> bool:
+        """Take over the points of the past days, return True if they changed."""
+        if points == self._attr_native_value:
+            return False
+        self._attr_native_value = points
+        self._async_points_changed()
+        return True
 
-        await self.hass.services.async_call(
-            domain=self._domain,
-            service=SERVICE_UPDATE_STREAK,
-            service_data={"goal_reached": goal_reached},
-            target={"entity_id": self._streak_entity_id},
+    async def add_points_to_score(self, goal_reached: bool) -> None:  # noqa: FBT001
+        """If nudge achieved, then add point to related score and its streak."""
+        self._scoreboard.instrumentation.count(
+            f"{COUNTER_CALLS}{SERVICE_ADD_POINTS_TO_USER}"
         )
+        self._scoreboard.async_apply_results({self.nudge_type: goal_reached})
 
     def get_unique_id(self) -> str:
         """"Return the unique id for score entity."""
@@ -506,7 +953,10 @@ class Score(RestoreNumber):
     @callback
     def reset_score(self, _: datetime) -> None:
         """Reset the score to zero."""
+        self._scoreboard.instrumentation.count(f"{COUNTER_CALLS}reset_score")
         self._attr_native_value = 0
+        self._async_points_changed()
+        self.async_write_ha_state()
 
     @property
     def extra_state_attributes(self) -> dict:
@@ -517,19 +967,34 @@ class Score(RestoreNumber):
         """Register cron jobs and restore last state."""
         now = datetime.now(tz=dt_util.DEFAULT_TIME_ZONE)
         new_year= now.replace(year=now.year+1,month=1,day=1,hour=0,minute=0,second=0)
-        async_track_point_in_time(self.hass,self.reset_score,new_year)
+        self.async_on_remove(
+            async_track_point_in_time(self.hass, self.reset_score, new_year)
+        )
         """Restore last state."""
         last_number_data = await self.async_get_last_number_data()
         if last_number_data and last_number_data.native_value:
             self._attr_native_value = int(last_number_data.native_value)
         else:
             self._attr_native_value = 0
+        self._ranking = async_get_ranking_engine(self.hass)
+        self.async_on_remove(
+            self._ranking.async_join(
+                self.nudge_type,
+                self._attr_unique_id,
+                self._attr_native_value,
+                self._async_rank_changed,
+            )
+        )
+        self.ranking_position = self._ranking.async_position(
+            self.nudge_type, self._attr_unique_id
+        )
 
 
     async def async_set_native_value(self, value: float) -> None:
         """Update the current value."""
         if value.is_integer():
             self._attr_native_value = int(value)
+            self._async_points_changed()
             self.async_write_ha_state()
 
 
@@ -540,89 +1005,226 @@ class TotalScore(NumberEntity):
     _attr_name = None
     _attr_mode = NumberMode.BOX
     _attr_native_unit_of_measurement = "points"
+    _attr_should_poll = False
 
     def __init__(
         self,
         entity_uuids_scores: dict[NudgeType, str],
-        domain: str,
         entry_id: str,
+        resolver: UniqueIdResolver,
         device_info: DeviceInfo | None = None,
+        instrumentation: Instrumentation | None = None,
     ) -> None:
         """Set up total score."""
         super().__init__()
+        self._instrumentation = instrumentation or Instrumentation(enabled=False)
         self._attr_device_info = device_info
         self.ranking_position = "0/0"
         self._attr_native_value: int = 0
         self._entity_ids: dict[NudgeType, str] = {}
+        self._nudge_types: dict[str, NudgeType] = {}
+        self._points: dict[NudgeType, int] = {}
+        self._device_entities: dict[frozenset[tuple[str, str]], list[str]] = {}
         self._entity_uuids_scores = entity_uuids_scores
-        self._domain = domain
+        self._resolver = resolver
+        self._ranking: RankingEngine | None = None
+        self._unsub_score_changes: CALLBACK_TYPE | None = None
         self._attr_name = "Total Score"
         self._attr_unique_id: str = f"{entry_id}_total_score"
 
     @staticmethod
     def get_entity_ids_from_uuid(
-        entity_registry: EntityRegistry, uuids: dict[NudgeType, str], domain: str
+        resolver: UniqueIdResolver, uuids: dict[NudgeType, str]
     ) -> dict[NudgeType, str]:
         """Return entity ids for given uuids."""
         entity_ids: dict[NudgeType, str] = {}
 
         for nudgetype, uuid in uuids.items():
-            entity_id = entity_registry.async_get_entity_id(
-                platform=domain, domain=Platform.NUMBER, unique_id=uuid
-            )
+            entity_id = resolver.async_get_entity_id(Platform.NUMBER, uuid)
             if entity_id:
                 entity_ids[nudgetype] = entity_id
 
         return entity_ids
 
+    @staticmethod
+    def get_points_from_state(state: State | None) -> int:
+        """Return the points of a score state, zero if it has none."""
+        if state is None or state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            return 0
+        try:
+            return int(float(state.state))
+        except ValueError:
+            return 0
+
     async def async_added_to_hass(self) -> None:
-        """Get entity ids from score unique ids."""
-        entity_registry = async_get_entity_registry(self.hass)
-        self._entity_ids = TotalScore.get_entity_ids_from_uuid(
-            entity_registry=entity_registry,
-            uuids=self._entity_uuids_scores,
-            domain=self._domain,
+        """Get entity ids from score unique ids and follow their states."""
+        self._async_update_score_entities()
+        self._ranking = async_get_ranking_engine(self.hass)
+        self.async_on_remove(
+            self._ranking.async_join(
+                None,
+                self._attr_unique_id,
+                self._attr_native_value,
+                self._async_rank_changed,
+            )
         )
+        self.ranking_position = self._ranking.async_position(None, self._attr_unique_id)
+        self.async_on_remove(
+            self._resolver.async_add_listener(self._async_scores_renamed)
+        )
+        self.async_on_remove(self._async_unsubscribe_scores)
+        for event_type in (
+            EVENT_DEVICE_REGISTRY_UPDATED,
+            EVENT_ENTITY_REGISTRY_UPDATED,
+        ):
+            self.async_on_remove(
+                self.hass.bus.async_listen(
+                    event_type, self._async_clear_device_entities
+                )
+            )
+        if missing := [
+            uuid
+            for nudge_type, uuid in self._entity_uuids_scores.items()
+            if nudge_type not in self._entity_ids
+        ]:
+            # Scores of the same platform may be registered after this entity.
+            task = self.hass.async_create_background_task(
+                self._async_wait_for_scores(missing),
+                f"{self.entity_id} resolve scores",
+            )
+            self.async_on_remove(task.cancel)
+
+    async def _async_wait_for_scores(self, uuids: list[str]) -> None:
+        """Wait until the resolver knows the entity ids of the scores."""
+        await asyncio.gather(
+            *(self._resolver.async_resolve(Platform.NUMBER, uuid) for uuid in uuids)
+        )
+        self._async_scores_renamed()
+
+    @callback
+    def _async_update_score_entities(self) -> bool:
+        """Follow the states of the resolved scores, return True if they changed."""
+        entity_ids = TotalScore.get_entity_ids_from_uuid(
+            resolver=self._resolver, uuids=self._entity_uuids_scores
+        )
+        if entity_ids == self._entity_ids:
+            return False
+        self._entity_ids = entity_ids
+        self._nudge_types = {
+            entity: nudge_type for nudge_type, entity in self._entity_ids.items()
+        }
+        self._points = {
+            nudge_type: TotalScore.get_points_from_state(self.hass.states.get(entity))
+            for nudge_type, entity in self._entity_ids.items()
+        }
+        self._attr_native_value = sum(self._points.values())
+        self._async_points_changed()
+        self._async_unsubscribe_scores()
+        if self._entity_ids:
+            self._unsub_score_changes = async_track_state_change_event(
+                self.hass,
+                list(self._entity_ids.values()),
+                self._async_score_changed,
+            )
+        return True
+
+    @callback
+    def _async_unsubscribe_scores(self) -> None:
+        """Stop following the states of the scores."""
+        if self._unsub_score_changes:
+            self._unsub_score_changes()
+            self._unsub_score_changes = None
+
+    @callback
+    def _async_scores_renamed(self) -> None:
+        """Follow scores that were registered or renamed after the setup."""
+        if self._async_update_score_entities():
+            self.async_write_ha_state()
+
+    @callback
+    def _async_score_changed(self, event: Event[EventStateChangedData]) -> None:
+        """Add the difference of a changed score to the total."""
+        nudge_type = self._nudge_types.get(event.data["entity_id"])
+        if nudge_type is None:
+            return
+        points = TotalScore.get_points_from_state(event.data["new_state"])
+        delta = points - self._points.get(nudge_type, 0)
+        if delta == 0:
+            return
+        self._points[nudge_type] = points
+        self._attr_native_value += delta
+        self._async_points_changed()
+        self.async_write_ha_state()
+        self._instrumentation.count(f"{COUNTER_STATE_WRITES}total_score")
 
-    async def async_update(self) -> None:
-        """Go through the list of scores and sum up total score."""
-        totalpoints: int = 0
-        points_per_nudge: dict[NudgeType, int] = {}
-        for nudge_type, score_entity in self._entity_ids.items():
-            state = self.hass.states.get(score_entity)
-            if state:
-                value = int(state.state)
-                totalpoints += value
-                points_per_nudge[nudge_type] = value
-
-        self._attr_native_value = totalpoints
-        self._attr_extra_state_attributes = {
-            nudge_type.name: score for nudge_type, score in points_per_nudge.items()
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Return the points per Nudge Type and the ranking."""
+        attributes: dict = {
+            nudge_type.name: points for nudge_type, points in self._points.items()
         }
-        self._attr_extra_state_attributes["Total"] = self.ranking_position
+        attributes["Total"] = self.ranking_position
+        return attributes
 
+    async def set_ranking_position(
+        self, ranking_position: int, ranking_length: int
+    ) -> None:
+        """Set ranking position until the next change of the standings."""
+        ranking = f"{ranking_position}/{ranking_length}"
+        if ranking == self.ranking_position:
+            return
+        self.ranking_position = ranking
         self.async_write_ha_state()
 
+    @callback
+    def _async_points_changed(self) -> None:
+        """Move the total score in the overall ranking."""
+        if self._ranking is None:
+            return
+        self._ranking.async_set_points(
+            None, self._attr_unique_id, self._attr_native_value
+        )
+        self.ranking_position = self._ranking.async_position(None, self._attr_unique_id)
+
+    @callback
+    def _async_rank_changed(self) -> None:
+        """Publish the position after the total of another household moved."""
+        if self._ranking is None:
+            return
+        ranking = self._ranking.async_position(None, self._attr_unique_id)
+        if ranking == self.ranking_position:
+            return
+        self.ranking_position = ranking
+        self.async_write_ha_state()
+
+    @callback
+    def _async_clear_device_entities(self, _: Event) -> None:
+        """Forget the cached device entities after a registry update."""
+        self._device_entities.clear()
+
     def get_entities_for_device_info(self, device_info: DeviceInfo) -> list:
         """Get all entities for a given device_info."""
-        entity_registry = async_get_entity_registry(self.hass)
-        device_registry = async_get_device_registry(self.hass)
-        device = None
-
         identifiers = device_info.get("identifiers")
         if identifiers is None:
             return []
 
-        for dev in device_registry.devices.values():
-            if any(identifier in dev.identifiers for identifier in identifiers):
-                device = dev
-                break
+        key = frozenset(identifiers)
+        if (entity_ids := self._device_entities.get(key)) is not None:
+            self._instrumentation.cache(CACHE_DEVICE_ENTITIES, hit=True)
+            return list(entity_ids)
+        self._instrumentation.cache(CACHE_DEVICE_ENTITIES, hit=False)
 
+        device_registry = async_get_device_registry(self.hass)
+        device = device_registry.async_get_device(identifiers=identifiers)
         if device is None:
             return []
 
-        return [
+        entity_registry = async_get_entity_registry(self.hass)
+        entity_ids = [
             entry.entity_id
-            for entry in entity_registry.entities.values()
-            if entry.device_id == device.id
+            for entry in async_entries_for_device(
+                entity_registry, device.id, include_disabled_entities=True
+            )
         ]
+        self._device_entities[key] = entity_ids
+        return list(entity_ids)
@@ -0,0 +1,219 @@
+"""Standings of the scores of all households."""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING
+
+from homeassistant.core import CALLBACK_TYPE, HassJob, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from datetime import datetime
+
+    from .platform import NudgeType
+
+DATA_RANKING_ENGINE = "nudge_household_ranking_engine"
+
+# Seconds to collect rank changes before the entities write their states,
+# so households that are set up together do not write once per other household.
+RANK_PUBLISH_DELAY = 1.0
+
+
+class FenwickTree:
+    """Count the participants per number of points with prefix sums."""
+
+    def __init__(self, size: int = 64) -> None:
+        """Set up a tree for points from zero to below size."""
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, points: int, amount: int) -> None:
+        """Add an amount to the participants with a number of points."""
+        index = points + 1
+        while index <= self.size:
+            self._tree[index] += amount
+            index += index & -index
+
+    def count_up_to(self, points: int) -> int:
+        """Return the number of participants with at most a number of points."""
+        index = min(points + 1, self.size)
+        count = 0
+        while index > 0:
+            count += self._tree[index]
+            index -= index & -index
+        return count
+
+
+class Standings:
+    """
+    Ordered points of the participants of one ranking.
+
+    A change of points is an update of the tree in O(log n) instead of a new
+    sort, participants with equal points share the rank. The occupied numbers
+    of points are kept sorted, so a change only visits the buckets in between
+    that have participants, no matter how far the points jumped.
+    """
+
+    def __init__(self) -> None:
+        """Set up empty standings."""
+        self._tree = FenwickTree()
+        self._points: dict[str, int] = {}
+        self._members_by_points: dict[int, set[str]] = {}
+        self._occupied: list[int] = []
+
+    def __len__(self) -> int:
+        """Return the number of participants."""
+        return len(self._points)
+
+    def __contains__(self, member: str) -> bool:
+        """Return True if a participant is part of the standings."""
+        return member in self._points
+
+    def members(self) -> set[str]:
+        """Return all participants."""
+        return set(self._points)
+
+    def rank(self, member: str) -> int:
+        """Return the rank of a participant, one plus everyone with more points."""
+        return 1 + len(self._points) - self._tree.count_up_to(self._points[member])
+
+    def set(self, member: str, points: int) -> set[str]:
+        """Set the points of a participant, return the others whose rank changed."""
+        points = max(points, 0)
+        previous = self._points.get(member)
+        if previous == points:
+            return set()
+        self.discard(member)
+        if points >= self._tree.size:
+            self._grow(points)
+        self._points[member] = points
+        if points not in self._members_by_points:
+            self._members_by_points[points] = set()
+            insort(self._occupied, points)
+        self._members_by_points[points].add(member)
+        self._tree.add(points, 1)
+        if previous is None:
+            return set()
+        # Only the participants between the old and the new points move.
+        low, high = sorted((previous, points))
+        first = bisect_left(self._occupied, low)
+        last = bisect_left(self._occupied, high)
+        return {
+            other
+            for others_points in self._occupied[first:last]
+            for other in self._members_by_points[others_points]
+            if other != member
+        }
+
+    def discard(self, member: str) -> None:
+        """Remove a participant."""
+        if (points := self._points.pop(member, None)) is not None:
+            self._remove(member, points)
+
+    def _remove(self, member: str, points: int) -> None:
+        """Take a participant out of the tree and the buckets."""
+        self._tree.add(points, -1)
+        members = self._members_by_points[points]
+        members.discard(member)
+        if not members:
+            del self._members_by_points[points]
+            del self._occupied[bisect_left(self._occupied, points)]
+
+    def _grow(self, points: int) -> None:
+        """Rebuild the tree with room for a number of points."""
+        size = self._tree.size
+        while size <= points:
+            size *= 2
+        self._tree = FenwickTree(size)
+        for member_points in self._points.values():
+            self._tree.add(member_points, 1)
+
+
+class RankingEngine:
+    """
+    Rank the scores of all households per Nudge Type and their total scores.
+
+    Participants join with a callback that is called once their published
+    position is out of date. A change of points only reaches the participants
+    whose rank moved, a joining or leaving one reaches all of its ranking.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Set up empty rankings."""
+        self.hass = hass
+        self._standings: dict[NudgeType | None, Standings] = {}
+        self._listeners: dict[str, Callable[[], None]] = {}
+        self._dirty: set[str] = set()
+        self._unsub_publish: CALLBACK_TYPE | None = None
+        self._publish_job = HassJob(self._async_publish, cancel_on_shutdown=True)
+
+    @callback
+    def async_join(
+        self,
+        nudge_type: NudgeType | None,
+        member: str,
+        points: int,
+        rank_changed: Callable[[], None],
+    ) -> CALLBACK_TYPE:
+        """Add a participant, None ranks the total scores, return how to leave."""
+        standings = self._standings.setdefault(nudge_type, Standings())
+        standings.set(member, points)
+        self._listeners[member] = rank_changed
+        self._async_mark_dirty(standings.members())
+
+        @callback
+        def async_leave() -> None:
+            standings.discard(member)
+            self._listeners.pop(member, None)
+            self._dirty.discard(member)
+            self._async_mark_dirty(standings.members())
+
+        return async_leave
+
+    @callback
+    def async_set_points(
+        self, nudge_type: NudgeType | None, member: str, points: int
+    ) -> None:
+        """Move a participant after its points changed."""
+        standings = self._standings.get(nudge_type)
+        if standings is None or member not in standings:
+            return
+        self._async_mark_dirty(standings.set(member, points))
+
+    @callback
+    def async_position(self, nudge_type: NudgeType | None, member: str) -> str:
+        """Return the published position of a participant, 0/0 if unranked."""
+        standings = self._standings.get(nudge_type)
+        if standings is None or member not in standings:
+            return "0/0"
+        return f"{standings.rank(member)}/{len(standings)}"
+
+    @callback
+    def _async_mark_dirty(self, members: set[str]) -> None:
+        """Publish the positions of some participants after the delay."""
+        if not members:
+            return
+        self._dirty |= members
+        if self._unsub_publish is None:
+            self._unsub_publish = async_call_later(
+                self.hass, RANK_PUBLISH_DELAY, self._publish_job
+            )
+
+    @callback
+    def _async_publish(self, _: datetime) -> None:
+        """Let every participant with a changed rank write its state."""
+        self._unsub_publish = None
+        dirty, self._dirty = self._dirty, set()
+        for member in dirty:
+            if (rank_changed := self._listeners.get(member)) is not None:
+                rank_changed()
+
+
+@callback
+def async_get_ranking_engine(hass: HomeAssistant) -> RankingEngine:
+    """Return the ranking engine shared by all config entries."""
+    if (engine := hass.data.get(DATA_RANKING_ENGINE)) is None:
+        engine = hass.data[DATA_RANKING_ENGINE] = RankingEngine(hass)
+    return engine
@@ -0,0 +1,138 @@
+"""Resolution of the Unique IDs of a household to their entity IDs."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.entity_registry import (
+    EVENT_ENTITY_REGISTRY_UPDATED,
+    EventEntityRegistryUpdatedData,
+)
+from homeassistant.helpers.entity_registry import (
+    async_get as async_get_entity_registry,
+)
+
+from .instrumentation import CACHE_RESOLVER, Instrumentation
+from .platform import get_entity_from_uuid
+
+if TYPE_CHECKING:
+    import asyncio
+    from collections.abc import Callable
+
+type UniqueIdKey = tuple[str, str]
+
+
+class UniqueIdResolver:
+    """
+    Map the Unique IDs of the entities of a config entry to their entity IDs.
+
+    Every Unique ID is looked up in the entity registry once, afterwards the
+    map follows the registry update events. Entities that are not registered
+    yet can be awaited, so a platform does not depend on the setup order.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        platform: str,
+        instrumentation: Instrumentation | None = None,
+    ) -> None:
+        """Set up the resolver for the entities of an integration."""
+        self.hass = hass
+        self._platform = platform
+        self._instrumentation = instrumentation or Instrumentation(enabled=False)
+        self._entity_ids: dict[UniqueIdKey, str] = {}
+        self._keys: dict[str, UniqueIdKey] = {}
+        self._waiting: dict[UniqueIdKey, list[asyncio.Future[str]]] = {}
+        self._listeners: list[Callable[[], None]] = []
+        self._unsub_registry: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Follow the entity registry until the returned callback is called."""
+        self._unsub_registry = self.hass.bus.async_listen(
+            EVENT_ENTITY_REGISTRY_UPDATED, self._async_registry_updated
+        )
+        return self.async_stop
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the entity registry and cancel all waiting lookups."""
+        if self._unsub_registry:
+            self._unsub_registry()
+            self._unsub_registry = None
+        for futures in self._waiting.values():
+            for future in futures:
+                future.cancel()
+        self._waiting.clear()
+
+    @callback
+    def async_get_entity_id(self, domain: str, unique_id: str) -> str | None:
+        """Return the entity ID of a Unique ID if it is registered."""
+        key = (domain, unique_id)
+        if (entity_id := self._entity_ids.get(key)) is not None:
+            self._instrumentation.cache(CACHE_RESOLVER, hit=True)
+            return entity_id
+        self._instrumentation.cache(CACHE_RESOLVER, hit=False)
+        entity_id = get_entity_from_uuid(
+            self.hass, uuid=unique_id, domain=self._platform, platform=domain
+        )
+        if entity_id is not None:
+            self._set(key, entity_id)
+        return entity_id
+
+    async def async_resolve(self, domain: str, unique_id: str) -> str:
+        """Return the entity ID of a Unique ID once it is registered."""
+        if (entity_id := self.async_get_entity_id(domain, unique_id)) is not None:
+            return entity_id
+        future: asyncio.Future[str] = self.hass.loop.create_future()
+        self._waiting.setdefault((domain, unique_id), []).append(future)
+        return await future
+
+    @callback
+    def async_add_listener(self, update_callback: Callable[[], None]) -> CALLBACK_TYPE:
+        """Call back whenever the entity ID of a known Unique ID changes."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _set(self, key: UniqueIdKey, entity_id: str) -> None:
+        """Store an entity ID and hand it to everybody waiting for it."""
+        self._entity_ids[key] = entity_id
+        self._keys[entity_id] = key
+        for future in self._waiting.pop(key, []):
+            if not future.done():
+                future.set_result(entity_id)
+
+    @callback
+    def _async_registry_updated(
+        self, event: Event[EventEntityRegistryUpdatedData]
+    ) -> None:
+        """Keep the map in line with created, renamed and removed entities."""
+        data = event.data
+        entity_id = data["entity_id"]
+        if data["action"] == "remove":
+            if (key := self._keys.pop(entity_id, None)) is None:
+                return
+            del self._entity_ids[key]
+        else:
+            old_entity_id = data.get("old_entity_id")
+            known = entity_id in self._keys or old_entity_id in self._keys
+            entry = async_get_entity_registry(self.hass).async_get(entity_id)
+            if entry is None or entry.platform != self._platform:
+                return
+            key = (entry.domain, entry.unique_id)
+            if not known and key not in self._waiting:
+                return
+            if old_entity_id is not None:
+                self._keys.pop(old_entity_id, None)
+            self._set(key, entity_id)
+
+        for update_callback in list(self._listeners):
+            update_callback()
@@ -0,0 +1,211 @@
+"""Yearly rollover of the goals of a household from last year's consumption."""
+
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Final, Literal
+
+from homeassistant.core import CALLBACK_TYPE, HassJob, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_AUTARKY_GOAL,
+    CONF_AUTARKY_GOAL_INCREASE,
+    CONF_BUDGET_ELECTRICITY_REDUCTION_GOAL,
+    CONF_BUDGET_HEAT_REDUCTION_GOAL,
+    CONF_BUDGET_WATER_REDUCTION_GOAL,
+    CONF_BUDGET_YEARLY_ELECTRICITY,
+    CONF_BUDGET_YEARLY_HEAT,
+    CONF_BUDGET_YEARLY_WATER,
+    CONF_GOALS_YEAR,
+    CONF_LAST_YEAR_CONSUMED,
+)
+from .instrumentation import COUNTER_QUERIES, HISTOGRAM_RECORDER_JOB
+from .platform import (
+    Budget,
+    Nudge,
+    NudgePeriod,
+    NudgeType,
+    fetch_statistic_changes,
+    get_start_time,
+)
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from .const import MyConfigEntry
+    from .instrumentation import Instrumentation
+
+_LOGGER = logging.getLogger(__name__)
+
+# Hour of New Year's Day, the recorder has compiled the old year by then.
+ROLLOVER_HOUR = 1
+
+# Yearly goal and reduction goal in the entry data per budget.
+BUDGET_GOALS: Final = {
+    NudgeType.ELECTRICITY_BUDGET: (
+        CONF_BUDGET_YEARLY_ELECTRICITY,
+        CONF_BUDGET_ELECTRICITY_REDUCTION_GOAL,
+    ),
+    NudgeType.HEAT_BUDGET: (CONF_BUDGET_YEARLY_HEAT, CONF_BUDGET_HEAT_REDUCTION_GOAL),
+    NudgeType.WATER_BUDGET: (
+        CONF_BUDGET_YEARLY_WATER,
+        CONF_BUDGET_WATER_REDUCTION_GOAL,
+    ),
+}
+
+
+def fetch_year_sums(
+    hass: HomeAssistant,
+    start_time: datetime,
+    end_time: datetime,
+    statistic_ids: set[str],
+    period: Literal["day", "month"] = "month",
+) -> dict[str, float]:
+    """Return the change of every statistic ID in one query, run in the executor."""
+    changes = fetch_statistic_changes(hass, start_time, end_time, statistic_ids, period)
+    return {
+        statistic_id: sum(change for _, change in changes.get(statistic_id, []))
+        for statistic_id in statistic_ids
+    }
+
+
+def next_budget_goal(
+    last_year_consumed: float, yearly_goal: float, reduction_goal: float
+) -> int:
+    """Return last year's consumption, or the old goal without any, reduced."""
+    base = last_year_consumed if last_year_consumed > 0 else yearly_goal
+    return int(base * (100 - reduction_goal) / 100)
+
+
+def next_autarky_goal(last_year_autarky: float, goal: float, increase: float) -> float:
+    """Return last year's autarky, or the old goal without any, increased."""
+    base = last_year_autarky if last_year_autarky > 0 else goal
+    return min(100.0, round(base * (100 + increase) / 100, 1))
+
+
+class YearlyRollover:
+    """
+    Derive the goals of a new year from the consumption of the last one.
+
+    Last year's change of every meter is read in one query. The Yearly Nudges
+    turn it into last year's consumption and autarky, from which new yearly
+    goals follow. Budgets split them through calculate_goals for every period.
+    All Nudges take their new goals in place and the entry data keeps them
+    without a reload.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: MyConfigEntry,
+        instrumentation: Instrumentation,
+    ) -> None:
+        """Set up the rollover without any Nudges."""
+        self.hass = hass
+        self._entry = entry
+        self._instrumentation = instrumentation
+        self._nudges: list[Nudge] = []
+        self._unsub_rollover: CALLBACK_TYPE | None = None
+        self._rollover_job = HassJob(self._async_rollover, cancel_on_shutdown=True)
+
+    @property
+    def is_due(self) -> bool:
+        """Return True if the goals were set in an earlier year."""
+        goals_year = self._entry.data.get(CONF_GOALS_YEAR)
+        return goals_year is not None and goals_year < dt_util.now().year
+
+    @callback
+    def async_register(self, nudge: Nudge) -> CALLBACK_TYPE:
+        """Add a Nudge whose goal follows the rollover."""
+        self._nudges.append(nudge)
+
+        @callback
+        def remove_nudge() -> None:
+            self._nudges.remove(nudge)
+
+        return remove_nudge
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Run the rollover early on the first day of every year."""
+        self._async_schedule()
+        return self.async_stop
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop the scheduled rollover."""
+        if self._unsub_rollover:
+            self._unsub_rollover()
+            self._unsub_rollover = None
+
+    @callback
+    def _async_schedule(self) -> None:
+        """Schedule the rollover of the next year."""
+        this_year = get_start_time(NudgePeriod.Yearly)
+        next_year = this_year.replace(year=this_year.year + 1, hour=ROLLOVER_HOUR)
+        self._unsub_rollover = async_track_point_in_time(
+            self.hass, self._rollover_job, next_year
+        )
+
+    async def _async_rollover(self, _: datetime) -> None:
+        """Run the rollover and schedule the next one."""
+        self._async_schedule()
+        await self.async_run()
+
+    async def async_run(self) -> None:
+        """Derive and apply the goals of the current year."""
+        from homeassistant.components.recorder import get_instance
+
+        yearly = {
+            nudge.nudge_type: nudge
+            for nudge in self._nudges
+            if nudge.nudge_period == NudgePeriod.Yearly
+        }
+        statistic_ids: set[str] = set().union(
+            *(nudge.statistic_ids for nudge in yearly.values())
+        )
+        this_year = get_start_time(NudgePeriod.Yearly)
+        last_year = this_year.replace(year=this_year.year - 1)
+        sums: dict[str, float] = {}
+        if statistic_ids:
+            started = self._instrumentation.start()
+            self._instrumentation.count(f"{COUNTER_QUERIES}statistics_during_period")
+            sums = await get_instance(self.hass).async_add_executor_job(
+                fetch_year_sums, self.hass, last_year, this_year, statistic_ids
+            )
+            self._instrumentation.observe(HISTOGRAM_RECORDER_JOB, "rollover", started)
+
+        data = dict(self._entry.data)
+        consumed: dict[str, float] = {}
+        goals: dict[NudgeType, float] = {}
+        for nudge_type, nudge in yearly.items():
+            if isinstance(nudge, Budget) and nudge_type in BUDGET_GOALS:
+                conf_goal, conf_reduction = BUDGET_GOALS[nudge_type]
+                consumed[nudge_type.name] = nudge.actual_from_statistics(sums)
+                goals[nudge_type] = data[conf_goal] = next_budget_goal(
+                    consumed[nudge_type.name],
+                    data.get(conf_goal, nudge.goal),
+                    data.get(conf_reduction, 0),
+                )
+            elif nudge_type == NudgeType.AUTARKY_GOAL:
+                consumed[nudge_type.name] = nudge.actual_from_statistics(sums)
+                goals[nudge_type] = data[CONF_AUTARKY_GOAL] = next_autarky_goal(
+                    consumed[nudge_type.name],
+                    data.get(CONF_AUTARKY_GOAL, nudge.goal),
+                    data.get(CONF_AUTARKY_GOAL_INCREASE, 0),
+                )
+
+        for nudge in self._nudges:
+            if (goal := goals.get(nudge.nudge_type)) is None:
+                continue
+            if isinstance(nudge, Budget):
+                nudge.set_budget_with_history_data(goal)
+            else:
+                nudge.async_set_goal(goal)
+
+        data[CONF_LAST_YEAR_CONSUMED] = consumed
+        data[CONF_GOALS_YEAR] = this_year.year
+        self.hass.config_entries.async_update_entry(self._entry, data=data)
+        _LOGGER.debug("Rolled the goals over to %d: %s", this_year.year, goals)
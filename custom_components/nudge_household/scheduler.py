@@ -0,0 +1,277 @@
+"""Statistics cache and query scheduler shared by all households."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from enum import StrEnum
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .accumulator import PeriodAccumulator
+from .forecast import ForecastModel
+from .instrumentation import (
+    CACHE_SHARED_FETCH,
+    COUNTER_QUERIES,
+    HISTOGRAM_RECORDER_JOB,
+    Instrumentation,
+)
+from .platform import NudgePeriod, fetch_period_totals
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_STATISTICS_SCHEDULER = "nudge_household_statistics_scheduler"
+SNAPSHOT_STORAGE_KEY = "nudge_household.snapshot"
+SNAPSHOT_STORAGE_VERSION = 1
+
+type PeriodStatistics = dict[NudgePeriod, dict[str, float]]
+type StatisticsRequest = dict[NudgePeriod, set[str]]
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    type PendingRequest = tuple[
+        StatisticsRequest,
+        Instrumentation,
+        AggregationMode,
+        asyncio.Future[PeriodStatistics],
+    ]
+
+
+class AggregationMode(StrEnum):
+    """Where the period sums of a household are calculated."""
+
+    # One total per statistic ID from the recorder, including the short-term
+    # statistics of the running hour.
+    DATABASE = "database"
+    # Sums of the cached daily and hourly rows.
+    ROWS = "rows"
+
+
+class StatisticsScheduler:
+    """
+    Batch the statistics requests of every household into recorder jobs.
+
+    Requests that arrive while a job runs are merged by statistic ID into the
+    next job, so there is at most one job of the integration in the recorder
+    executor no matter how many households are set up. All households share
+    one cache of daily sums per statistic ID, and one forecast model that is
+    fitted to it once a day.
+
+    The cache is saved when Home Assistant stops and restored with the first
+    household, so the first job after a restart only reads what is new.
+    Statistic IDs that no household requests any more are dropped from the
+    cache before every job and before it is saved.
+
+    The queries and cache lookups of a job are counted once in the shared
+    instrumentation, every household of the job only records how long it
+    waited for it.
+
+    Households in the database aggregation mode get their own job. When the
+    database can not aggregate the statistics, they are served from the rows
+    from then on. Any other error fails only their job, and they try again
+    with the next refresh.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Set up an empty scheduler."""
+        self.hass = hass
+        self.accumulator = PeriodAccumulator()
+        self.forecast = ForecastModel()
+        self.instrumentation = Instrumentation(enabled=False)
+        self._pending: list[PendingRequest] = []
+        self._worker: asyncio.Task[None] | None = None
+        self._snapshot_store: Store[dict[str, Any]] = Store(
+            hass, SNAPSHOT_STORAGE_VERSION, SNAPSHOT_STORAGE_KEY
+        )
+        self._snapshot_loaded: asyncio.Task[None] | None = None
+        self._sources: list[Callable[[], set[str]]] = []
+        self.database_supported = True
+
+    @callback
+    def async_add_source(self, statistic_ids: Callable[[], set[str]]) -> CALLBACK_TYPE:
+        """Keep the statistic IDs a household requests in the shared cache."""
+        self._sources.append(statistic_ids)
+
+        @callback
+        def remove_source() -> None:
+            self._sources.remove(statistic_ids)
+
+        return remove_source
+
+    @callback
+    def async_aggregation_mode(self, mode: AggregationMode) -> AggregationMode:
+        """Return the mode the requests of a household run in."""
+        if mode is AggregationMode.DATABASE and not self.database_supported:
+            return AggregationMode.ROWS
+        return mode
+
+    @callback
+    def _async_statistic_ids_in_use(self) -> set[str]:
+        """Return the statistic IDs any household requests."""
+        return set().union(*(statistic_ids() for statistic_ids in self._sources))
+
+    async def async_load_snapshot(self) -> None:
+        """Restore the cache of the last run once for all households."""
+        if self._snapshot_loaded is None:
+            self._snapshot_loaded = self.hass.async_create_task(
+                self._async_load_snapshot(), eager_start=True
+            )
+        await self._snapshot_loaded
+
+    async def _async_load_snapshot(self) -> None:
+        """Read the saved cache and save it again when Home Assistant stops."""
+        self.hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, self._async_save_snapshot
+        )
+        data = await self._snapshot_store.async_load()
+        if not data:
+            return
+        self.accumulator.restore(data.get("accumulator", {}))
+
+    async def _async_save_snapshot(self, _: Event) -> None:
+        """Save the cache of the statistic IDs that are still requested."""
+        accumulator = await self.hass.async_add_executor_job(
+            self._snapshot, self._async_statistic_ids_in_use()
+        )
+        if not accumulator:
+            return
+        await self._snapshot_store.async_save({"accumulator": accumulator})
+
+    def _snapshot(self, in_use: set[str]) -> dict[str, Any]:
+        """Return the cache of the requested statistic IDs, run in the executor."""
+        self.accumulator.retain(in_use)
+        return self.accumulator.as_dict()
+
+    async def async_fetch(
+        self,
+        requested: StatisticsRequest,
+        instrumentation: Instrumentation,
+        mode: AggregationMode = AggregationMode.ROWS,
+    ) -> PeriodStatistics:
+        """Return the period sums of the requested statistic IDs."""
+        future: asyncio.Future[PeriodStatistics] = self.hass.loop.create_future()
+        instrumentation.cache(CACHE_SHARED_FETCH, hit=bool(self._pending))
+        self._pending.append((requested, instrumentation, mode, future))
+        if self._worker is None:
+            self._worker = self.hass.async_create_background_task(
+                self._async_run_jobs(), "nudge_household statistics jobs"
+            )
+        return await future
+
+    async def _async_run_jobs(self) -> None:
+        """Run one recorder job per batch until no request is left."""
+        batch: list[PendingRequest] = []
+        try:
+            # Let the households refreshing at the same time join the batch.
+            await asyncio.sleep(0)
+            while self._pending:
+                batch, self._pending = self._pending, []
+                for mode in AggregationMode:
+                    await self._async_run_job(
+                        mode,
+                        [
+                            request
+                            for request in batch
+                            if self.async_aggregation_mode(request[2]) is mode
+                        ],
+                    )
+                batch = []
+        finally:
+            self._worker = None
+            for *_, future in batch + self._pending:
+                future.cancel()
+            self._pending = []
+
+    async def _async_run_job(
+        self, mode: AggregationMode, batch: list[PendingRequest]
+    ) -> None:
+        """Fetch the union of a batch in a mode and hand every household its part."""
+        from homeassistant.components.recorder import get_instance
+
+        if not batch:
+            return
+        merged: StatisticsRequest = {}
+        for requested, *_ in batch:
+            for period, statistic_ids in requested.items():
+                merged.setdefault(period, set()).update(statistic_ids)
+        in_use = self._async_statistic_ids_in_use().union(*merged.values())
+        self.instrumentation.enabled = any(
+            instrumentation.enabled for _, instrumentation, *_ in batch
+        )
+        started = self.instrumentation.start()
+        try:
+            result = await get_instance(self.hass).async_add_executor_job(
+                self._fetch, mode, merged, in_use, self.instrumentation
+            )
+        except Exception as err:  # noqa: BLE001
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        self.instrumentation.observe(HISTOGRAM_RECORDER_JOB, mode, started)
+        for requested, instrumentation, _, future in batch:
+            instrumentation.observe(
+                HISTOGRAM_RECORDER_JOB,
+                mode,
+                started if instrumentation.enabled else None,
+            )
+            if not future.done():
+                future.set_result(
+                    {
+                        period: {
+                            statistic_id: result[period][statistic_id]
+                            for statistic_id in statistic_ids
+                        }
+                        for period, statistic_ids in requested.items()
+                    }
+                )
+
+    def _fetch(
+        self,
+        mode: AggregationMode,
+        requested: StatisticsRequest,
+        in_use: set[str],
+        instrumentation: Instrumentation,
+    ) -> PeriodStatistics:
+        """Return the period sums in an aggregation mode, run in the executor."""
+        from sqlalchemy.exc import CompileError, NotSupportedError
+
+        if mode is AggregationMode.DATABASE:
+            instrumentation.count(
+                f"{COUNTER_QUERIES}statistic_during_period",
+                sum(len(ids) for ids in requested.values()),
+            )
+            try:
+                return fetch_period_totals(self.hass, requested)
+            except (CompileError, NotSupportedError):
+                _LOGGER.warning(
+                    "The database can not aggregate the statistics, "
+                    "falling back to summing the rows",
+                    exc_info=True,
+                )
+                self.database_supported = False
+        self.accumulator.retain(in_use)
+        result = self.accumulator.fetch(self.hass, requested, instrumentation)
+        self._fit_forecast()
+        return result
+
+    def _fit_forecast(self) -> None:
+        """Refit the forecast model to the cached days once a day."""
+        first_day, series = self.accumulator.daily_history()
+        today = dt_util.now().date()
+        if first_day is None or self.forecast.is_fitted(today, set(series)):
+            return
+        self.forecast.fit(first_day, series, today)
+
+
+@callback
+def async_get_statistics_scheduler(hass: HomeAssistant) -> StatisticsScheduler:
+    """Return the statistics scheduler shared by all config entries."""
+    if (scheduler := hass.data.get(DATA_STATISTICS_SCHEDULER)) is None:
+        scheduler = hass.data[DATA_STATISTICS_SCHEDULER] = StatisticsScheduler(hass)
+    return scheduler
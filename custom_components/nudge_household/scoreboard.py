@@ -0,0 +1,82 @@
+"""In-process dispatcher for the scores and streaks of a household."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from homeassistant.core import callback
+
+from .instrumentation import COUNTER_STATE_WRITES
+
+if TYPE_CHECKING:
+    from homeassistant.helpers.entity import Entity
+
+    from .backfill import DailyHistory
+    from .instrumentation import Instrumentation
+    from .platform import NudgeType, Score, Streak, TotalScore
+
+
+class Scoreboard:
+    """
+    Hold direct references to the gamification entities of a config entry.
+
+    Results of Nudges are applied with plain method calls instead of chained
+    service calls and every touched entity writes its state only once.
+    """
+
+    def __init__(self, instrumentation: Instrumentation) -> None:
+        """Set up an empty scoreboard."""
+        self.instrumentation = instrumentation
+        self._scores: dict[NudgeType, Score] = {}
+        self._streaks: dict[NudgeType, Streak] = {}
+        self._total_score: TotalScore | None = None
+
+    @callback
+    def async_add_score(self, score: Score, streak: Streak) -> None:
+        """Add the score and streak of a Nudge Type."""
+        self._scores[score.nudge_type] = score
+        self._streaks[streak.nudge_type] = streak
+
+    @callback
+    def async_set_total_score(self, total_score: TotalScore) -> None:
+        """Set the total score of the household."""
+        self._total_score = total_score
+
+    @callback
+    def async_apply_results(self, results: dict[NudgeType, bool]) -> None:
+        """Add points and update streaks for the results of several Nudges."""
+        changed: list[Entity] = []
+        for nudge_type, goal_reached in results.items():
+            for entity in (self._scores.get(nudge_type), self._streaks.get(nudge_type)):
+                if entity is None or entity.hass is None:
+                    continue
+                if entity.apply_result(goal_reached=goal_reached):
+                    changed.append(entity)
+
+        for entity in changed:
+            entity.async_write_ha_state()
+        self.instrumentation.count(f"{COUNTER_STATE_WRITES}scoreboard", len(changed))
+
+    @callback
+    def async_apply_history(self, histories: dict[NudgeType, DailyHistory]) -> None:
+        """Seed the scores and streaks with the outcome of the past days."""
+        changed: list[Entity] = []
+        for nudge_type, history in histories.items():
+            score = self._scores.get(nudge_type)
+            if (
+                score is not None
+                and score.hass is not None
+                and score.apply_history(history.points)
+            ):
+                changed.append(score)
+            streak = self._streaks.get(nudge_type)
+            if (
+                streak is not None
+                and streak.hass is not None
+                and streak.apply_history(history.streak, history.best_streak)
+            ):
+                changed.append(streak)
+
+        for entity in changed:
+            entity.async_write_ha_state()
+        self.instrumentation.count(f"{COUNTER_STATE_WRITES}scoreboard", len(changed))
@@ -1,21 +1,33 @@
-from datetime import datetime
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
 
+import numpy as np
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers import entity_registry
+from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.util import dt as dt_util
+from homeassistant.helpers.typing import StateType
 
 from custom_components.nudge_household.platform import (
     Budget,
-    EnergyElectricDevices,
+    EnergyEntities,
+    EnergyTopology,
     Nudge,
+    NudgeForecast,
     NudgePeriod,
     NudgeType,
-    get_energy_entities,
-    get_own_total_consumtion,
+    calculate_own_total_consumtion,
+    get_energy_statistic_ids,
+    split_own_total_consumtion,
+    sum_energy_series,
 )
 
 from .const import (
@@ -25,6 +37,8 @@ from .const import (
     CONF_BUDGET_WATER_REDUCTION_GOAL,
     CONF_BUDGET_YEARLY_ELECTRICITY,
     CONF_BUDGET_YEARLY_HEAT,
+    CONF_BUDGET_YEARLY_WATER,
+    CONF_INSTRUMENTATION,
     CONF_LAST_YEAR_CONSUMED,
     CONF_NAME_HOUSEHOLD,
     CONF_SIZE_HOUSEHOLD,
@@ -32,6 +46,84 @@ from .const import (
     STEP_IDS,
     MyConfigEntry,
 )
+from .coordinator import NudgeStatisticsCoordinator
+from .instrumentation import (
+    COUNTER_CALLS,
+    COUNTER_QUERIES,
+    COUNTER_STATE_WRITES,
+    HISTOGRAM_ENTITY_UPDATE,
+    HISTOGRAM_RECORDER_JOB,
+    Instrumentation,
+)
+from .topology import async_get_energy_topology, get_sub_meter_topology
+
+# Only the debug sensors poll, every other entity is pushed.
+SCAN_INTERVAL = timedelta(minutes=1)
+
+
+@dataclass(frozen=True, kw_only=True)
+class InstrumentationSensorDescription(SensorEntityDescription):
+    """Describe a debug sensor that reads the instrumentation of a household."""
+
+    value_fn: Callable[[Instrumentation], StateType]
+    attributes_fn: Callable[[Instrumentation], dict[str, Any]]
+
+
+def _cache_hit_percentage(instrumentation: Instrumentation) -> float | None:
+    """Return the hit rate of all caches in percent."""
+    rate = instrumentation.cache_hit_rate()
+    return None if rate is None else round(rate * 100, 1)
+
+
+def _mean_milliseconds(histogram: str) -> Callable[[Instrumentation], float]:
+    """Return a reader of the mean duration of a histogram."""
+    return lambda i: round(i.histogram_totals(histogram)["mean_ms"], 2)
+
+
+INSTRUMENTATION_SENSORS = (
+    InstrumentationSensorDescription(
+        key="recorder_queries",
+        name="Recorder queries",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda i: sum(i.counters(COUNTER_QUERIES).values()),
+        attributes_fn=lambda i: i.counters(COUNTER_QUERIES),
+    ),
+    InstrumentationSensorDescription(
+        key="recorder_job_duration",
+        name="Recorder job duration",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=_mean_milliseconds(HISTOGRAM_RECORDER_JOB),
+        attributes_fn=lambda i: i.histograms(HISTOGRAM_RECORDER_JOB),
+    ),
+    InstrumentationSensorDescription(
+        key="update_latency",
+        name="Update latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=_mean_milliseconds(HISTOGRAM_ENTITY_UPDATE),
+        attributes_fn=lambda i: i.histograms(HISTOGRAM_ENTITY_UPDATE),
+    ),
+    InstrumentationSensorDescription(
+        key="cache_hit_rate",
+        name="Cache hit rate",
+        native_unit_of_measurement=PERCENTAGE,
+        value_fn=_cache_hit_percentage,
+        attributes_fn=lambda i: i.as_dict()["caches"],
+    ),
+    InstrumentationSensorDescription(
+        key="state_writes",
+        name="State writes",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda i: sum(i.counters(COUNTER_STATE_WRITES).values()),
+        attributes_fn=lambda i: i.counters(COUNTER_STATE_WRITES),
+    ),
+    InstrumentationSensorDescription(
+        key="scoring_calls",
+        name="Scoring calls",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda i: sum(i.counters(COUNTER_CALLS).values()),
+        attributes_fn=lambda i: i.counters(COUNTER_CALLS),
+    ),
+)
 
 
 async def async_setup_entry(
@@ -42,20 +134,13 @@ async def async_setup_entry(
     yearly_goal = config_entry.data.get(CONF_LAST_YEAR_CONSUMED, 0)
     number_of_persons = config_entry.data.get(CONF_SIZE_HOUSEHOLD, {""})
     name_household = config_entry.data.get(CONF_NAME_HOUSEHOLD, "")
-    energy_entities, gas, water = await get_energy_entities(hass=hass)
+    topology_tracker = await async_get_energy_topology(hass)
+    sub_meter_topology = get_sub_meter_topology(config_entry.data)
+    topology = sub_meter_topology or topology_tracker.topology
+    energy_entities, gas, water = topology.energy_entities, topology.gas, topology.water
+    coordinator = config_entry.runtime_data.coordinator
 
     entities = []
-    er = entity_registry.async_get(hass)
-    score_device_unique_ids = config_entry.runtime_data.score_device_unique_ids
-    nudge_type_score_entity_ids: dict[NudgeType, str | None] = {}
-    for nudge_type, unique_id in score_device_unique_ids.items():
-        if unique_id:
-            nudge_type_score_entity_ids[nudge_type] = er.async_get_entity_id(
-                platform=DOMAIN_NUDGE_HOUSEHOLD,
-                domain=Platform.NUMBER,
-                unique_id=unique_id,
-            )
-
     autarky_goal = config_entry.data.get(CONF_AUTARKY_GOAL)
     if autarky_goal:
         entities.extend(
@@ -63,7 +148,7 @@ async def async_setup_entry(
                 config_entry,
                 energy_entities,
                 autarky_goal,
-                score_entity=nudge_type_score_entity_ids[NudgeType.AUTARKY_GOAL],
+                coordinator=coordinator,
             )
         )
 
@@ -80,8 +165,8 @@ async def async_setup_entry(
                 nudge_type=nudge_type,
                 energy_entities=energy_entities,
                 budget_yearly_goal=electricity_budget_goal,
-                score_entity=nudge_type_score_entity_ids[nudge_type],
                 reduction_goal=electricity_reduction_goal,
+                coordinator=coordinator,
             )
         )
 
@@ -93,13 +178,13 @@ async def async_setup_entry(
             create_budget_device(
                 config_entry=config_entry,
                 nudge_type=nudge_type,
-                budget_entities={gas},
+                budget_entities=set(gas),
                 budget_yearly_goal=heat_budget_goal,
-                score_entity=nudge_type_score_entity_ids[nudge_type],
                 reduction_goal=heat_reduction_goal,
+                coordinator=coordinator,
             )
         )
-    water_budget_goal = config_entry.data.get(CONF_BUDGET_YEARLY_HEAT)
+    water_budget_goal = config_entry.data.get(CONF_BUDGET_YEARLY_WATER)
     if water_budget_goal and water:
         water_reduction_goal = config_entry.data.get(
             CONF_BUDGET_WATER_REDUCTION_GOAL, 0
@@ -109,13 +194,71 @@ async def async_setup_entry(
             create_budget_device(
                 config_entry=config_entry,
                 nudge_type=nudge_type,
-                budget_entities={water},
+                budget_entities=set(water),
                 budget_yearly_goal=water_budget_goal,
-                score_entity=nudge_type_score_entity_ids[nudge_type],
                 reduction_goal=water_reduction_goal,
+                coordinator=coordinator,
             )
         )
-    async_add_entities(entities)
+
+    settlement = config_entry.runtime_data.settlement
+    rollover = config_entry.runtime_data.rollover
+    for entity in entities:
+        config_entry.async_on_unload(settlement.async_register(entity))
+        config_entry.async_on_unload(rollover.async_register(entity))
+
+    @callback
+    def async_topology_changed(
+        old_topology: EnergyTopology, new_topology: EnergyTopology
+    ) -> None:
+        """Reconfigure the Nudges whose sources changed in the Energy Dashboard."""
+        changed = old_topology.changed_nudge_types(new_topology)
+        for entity in entities:
+            if entity.nudge_type in changed:
+                entity.async_apply_topology(new_topology)
+
+    # A household with its own sub meters does not follow the Energy Dashboard.
+    if sub_meter_topology is None:
+        config_entry.async_on_unload(
+            topology_tracker.async_add_listener(async_topology_changed)
+        )
+    async_add_entities([*entities, *(NudgeForecast(entity) for entity in entities)])
+
+    if config_entry.options.get(CONF_INSTRUMENTATION, False):
+        async_add_entities(
+            InstrumentationSensor(config_entry, description)
+            for description in INSTRUMENTATION_SENSORS
+        )
+
+
+class InstrumentationSensor(SensorEntity):
+    """Debug sensor with the runtime costs of a household."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_has_entity_name = True
+    entity_description: InstrumentationSensorDescription
+
+    def __init__(
+        self,
+        config_entry: MyConfigEntry,
+        description: InstrumentationSensorDescription,
+    ) -> None:
+        """Set up the sensor on the scoreboard device of the household."""
+        self.entity_description = description
+        self._instrumentation = config_entry.runtime_data.instrumentation
+        self._attr_unique_id = f"{config_entry.entry_id}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(f"{DOMAIN_NUDGE_HOUSEHOLD}_score", config_entry.entry_id)}
+        )
+
+    async def async_update(self) -> None:
+        """Read the current values of the instrumentation."""
+        self._attr_native_value = self.entity_description.value_fn(
+            self._instrumentation
+        )
+        self._attr_extra_state_attributes = self.entity_description.attributes_fn(
+            self._instrumentation
+        )
 
 
 class Autarky(Nudge):
@@ -126,9 +269,9 @@ class Autarky(Nudge):
         attr_name: str,
         entry_id: str,
         goal: float,
-        energy_entities: dict[EnergyElectricDevices, str],
-        score_entity: str | None,
+        energy_entities: EnergyEntities,
         domain: str,
+        coordinator: NudgeStatisticsCoordinator,
     ) -> None:
         super().__init__(
             device_info=device_info,
@@ -136,19 +279,22 @@ class Autarky(Nudge):
             attr_name=attr_name,
             entry_id=entry_id,
             goal=goal,
-            score_entity=score_entity,
             nudge_type=NudgeType.AUTARKY_GOAL,
             domain=domain,
+            coordinator=coordinator,
         )
         self._attr_native_value = 0.0
         self._attr_native_unit_of_measurement = "%"
         self.energy_entities = energy_entities
 
-    async def get_autarky(self) -> float:
-        own_consumption, total_consumption = await get_own_total_consumtion(
-            energy_entities=self.energy_entities,
-            period=self._nudge_period,
-            hass=self.hass,
+    @property
+    def statistic_ids(self) -> set[str]:
+        """Return the statistic IDs of all meters of the household."""
+        return get_energy_statistic_ids(self.energy_entities)
+
+    def get_autarky(self, stats: dict[str, float]) -> float:
+        own_consumption, total_consumption = calculate_own_total_consumtion(
+            energy_entities=self.energy_entities, stats=stats
         )
         if total_consumption == 0:
             autarky = 0
@@ -156,19 +302,48 @@ class Autarky(Nudge):
             autarky = (own_consumption / total_consumption) * 100
         return autarky
 
-    async def async_update(self) -> None:
-        self._last_update = datetime.now(tz=dt_util.DEFAULT_TIME_ZONE)
-        self._attr_native_value = await self.get_autarky()
-        self._goal_reached = self._attr_native_value > self._goal
-        self.async_write_ha_state()
+    def set_sources(self, topology: EnergyTopology) -> None:
+        """Take the meters of the household from the energy topology."""
+        self.energy_entities = topology.energy_entities
+
+    def actual_from_statistics(self, stats: dict[str, float]) -> float:
+        """Return the autarky of the summed statistics."""
+        return self.get_autarky(stats)
+
+    def state_for(self, actual: float) -> float:
+        """Return the autarky itself."""
+        return actual
+
+    def goal_reached_for(self, actual: float) -> bool:
+        """Return if the autarky exceeds the goal."""
+        return actual > self._goal
+
+    def update_from_statistics(self, stats: dict[str, float]) -> None:
+        """Set the autarky of the period and if it reaches the goal."""
+        self._attr_native_value = self.get_autarky(stats)
+        self._goal_reached = self.goal_reached_for(self._attr_native_value)
+
+    def evaluate_history(self, series: dict[str, np.ndarray], days: int) -> np.ndarray:
+        """Return for every day if its autarky exceeds the goal."""
+        own_consumption, total_consumption = split_own_total_consumtion(
+            sum_energy_series(self.energy_entities, series, days)
+        )
+        autarky = np.divide(
+            own_consumption * 100,
+            total_consumption,
+            out=np.zeros(days),
+            where=total_consumption != 0,
+        )
+        return autarky > self._goal
+
 
 def create_budget_device(
     config_entry: ConfigEntry,
     nudge_type: NudgeType,
     budget_yearly_goal: float,
-    score_entity: str | None,
     reduction_goal: int,
-    energy_entities: dict[EnergyElectricDevices, str] | None = None,
+    coordinator: NudgeStatisticsCoordinator,
+    energy_entities: EnergyEntities | None = None,
     budget_entities: set[str] | None = None,
 ) -> list[Budget]:
     nudge_medium_type = STEP_IDS[nudge_type]
@@ -191,10 +366,10 @@ def create_budget_device(
             attr_name=f"{config_entry.title}_{nudge_type.name}_{nudge_period.name}",
             energy_entities=energy_entities,
             budget_entities=budget_entities,
-            score_entity=score_entity,
             nudge_type=nudge_type,
             domain=DOMAIN_NUDGE_HOUSEHOLD,
-            reduction_goal= reduction_goal
+            reduction_goal= reduction_goal,
+            coordinator=coordinator,
         )
         for nudge_period in NudgePeriod
     ]
@@ -203,9 +378,9 @@ def create_budget_device(
 
 def create_autarky_device(
     config_entry: ConfigEntry,
-    energy_entities: dict[EnergyElectricDevices, str],
+    energy_entities: EnergyEntities,
     autarky_goal: int,
-    score_entity: str | None,
+    coordinator: NudgeStatisticsCoordinator,
 ) -> list[Autarky]:
     nudge_medium_type = STEP_IDS[NudgeType.AUTARKY_GOAL]
     device_info_autarky = DeviceInfo(
@@ -224,8 +399,8 @@ def create_autarky_device(
             entry_id=f"{config_entry.entry_id}_{nudge_medium_type}",
             goal=autarky_goal,
             energy_entities=energy_entities,
-            score_entity=score_entity,
             domain=DOMAIN_NUDGE_HOUSEHOLD,
+            coordinator=coordinator,
         )
         for nudge_period in NudgePeriod
     ]
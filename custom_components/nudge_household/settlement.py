@@ -0,0 +1,68 @@
+"""End of day settlement of the Daily Nudges of a household."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_change
+
+from .instrumentation import COUNTER_CALLS
+from .platform import Nudge, NudgePeriod, NudgeType
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from .history import ScoreHistory
+    from .scoreboard import Scoreboard
+
+
+class DailySettlement:
+    """Evaluate all Daily Nudges of a config entry once at the end of the day."""
+
+    def __init__(
+        self, hass: HomeAssistant, scoreboard: Scoreboard, history: ScoreHistory
+    ) -> None:
+        """Set up the settlement without any Nudges."""
+        self.hass = hass
+        self._scoreboard = scoreboard
+        self._history = history
+        self._nudges: list[Nudge] = []
+
+    @property
+    def nudges(self) -> list[Nudge]:
+        """Return the Daily Nudges of the household."""
+        return list(self._nudges)
+
+    @callback
+    def async_register(self, nudge: Nudge) -> CALLBACK_TYPE:
+        """Add a Daily Nudge to the settlement."""
+        if nudge.nudge_period != NudgePeriod.Daily:
+            return lambda: None
+        self._nudges.append(nudge)
+
+        @callback
+        def remove_nudge() -> None:
+            self._nudges.remove(nudge)
+
+        return remove_nudge
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Run the settlement every evening shortly before midnight."""
+        return async_track_time_change(
+            self.hass, self.async_settle, hour=23, minute=59, second=59
+        )
+
+    @callback
+    def async_settle(self, now: datetime) -> None:
+        """Apply the result of every Daily Nudge to the scoreboard in one batch."""
+        self._scoreboard.instrumentation.count(f"{COUNTER_CALLS}async_settle")
+        results: dict[NudgeType, bool] = {
+            nudge.nudge_type: nudge.goal_reached
+            for nudge in self._nudges
+            if nudge.hass is not None
+        }
+        if results:
+            self._history.async_record(now.date(), results)
+            self._scoreboard.async_apply_results(results)
@@ -0,0 +1,137 @@
+"""Goal suggestions for a new household from last year's consumption."""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import TYPE_CHECKING, Final
+
+from .platform import (
+    NudgePeriod,
+    NudgeType,
+    calculate_own_total_consumtion,
+    get_start_time,
+)
+from .rollover import fetch_year_sums, next_autarky_goal, next_budget_goal
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+    from .platform import EnergyTopology
+
+# Days of history the suggestions are derived from.
+SUGGESTION_DAYS = 365
+DEFAULT_REDUCTION_GOAL = 10
+DEFAULT_AUTARKY_GOAL_INCREASE = 5
+# Budget sliders reach from this share up to this multiple of the consumption.
+BUDGET_RANGE = (0.25, 2.0)
+# Number of slider steps a budget range is roughly divided into.
+BUDGET_SLIDER_STEPS = 100
+
+
+@dataclass(frozen=True)
+class GoalSuggestion:
+    """Default value and slider range of the goal of one Nudge Type."""
+
+    default: float
+    minimum: float
+    maximum: float
+    step: float
+
+
+# Sliders of a household without any history.
+DEFAULT_BUDGET: Final = GoalSuggestion(
+    default=3000, minimum=1000, maximum=10000, step=100
+)
+DEFAULT_AUTARKY: Final = GoalSuggestion(default=50, minimum=1, maximum=100, step=1)
+
+
+def nice_step(value: float) -> float:
+    """Return 1, 2 or 5 times a power of ten closest above a value."""
+    if value <= 1:
+        return 1
+    magnitude = 10 ** math.floor(math.log10(value))
+    return next(
+        factor * magnitude for factor in (1, 2, 5, 10) if factor * magnitude >= value
+    )
+
+
+def suggest_budget(consumed: float) -> GoalSuggestion:
+    """Return a budget reduced from last year's consumption and a slider around."""
+    if consumed <= 0:
+        return DEFAULT_BUDGET
+    low, high = BUDGET_RANGE
+    step = nice_step(consumed * (high - low) / BUDGET_SLIDER_STEPS)
+    default = next_budget_goal(consumed, DEFAULT_BUDGET.default, DEFAULT_REDUCTION_GOAL)
+    return GoalSuggestion(
+        default=round(default / step) * step,
+        minimum=max(math.floor(consumed * low / step) * step, step),
+        maximum=math.ceil(consumed * high / step) * step,
+        step=step,
+    )
+
+
+def suggest_autarky(autarky: float) -> GoalSuggestion:
+    """Return an autarky goal increased from last year's autarky."""
+    if autarky <= 0:
+        return DEFAULT_AUTARKY
+    default = next_autarky_goal(
+        autarky, DEFAULT_AUTARKY.default, DEFAULT_AUTARKY_GOAL_INCREASE
+    )
+    return GoalSuggestion(
+        default=max(round(default), DEFAULT_AUTARKY.minimum),
+        minimum=DEFAULT_AUTARKY.minimum,
+        maximum=DEFAULT_AUTARKY.maximum,
+        step=DEFAULT_AUTARKY.step,
+    )
+
+
+def suggest_goals(
+    topology: EnergyTopology,
+    nudge_types: set[NudgeType],
+    sums: dict[str, float],
+) -> dict[NudgeType, GoalSuggestion]:
+    """Return the suggestions of some Nudge Types from last year's sums."""
+    own_consumption, total_consumption = calculate_own_total_consumtion(
+        topology.energy_entities, sums
+    )
+    consumed = {
+        NudgeType.ELECTRICITY_BUDGET: own_consumption,
+        NudgeType.HEAT_BUDGET: sum(sums.get(gas, 0.0) for gas in topology.gas),
+        NudgeType.WATER_BUDGET: sum(sums.get(water, 0.0) for water in topology.water),
+    }
+    suggestions: dict[NudgeType, GoalSuggestion] = {}
+    for nudge_type in nudge_types:
+        if nudge_type == NudgeType.AUTARKY_GOAL:
+            autarky = (
+                own_consumption / total_consumption * 100 if total_consumption else 0
+            )
+            suggestions[nudge_type] = suggest_autarky(autarky)
+        elif nudge_type in consumed:
+            suggestions[nudge_type] = suggest_budget(consumed[nudge_type])
+    return suggestions
+
+
+async def async_suggest_goals(
+    hass: HomeAssistant, topology: EnergyTopology, nudge_types: set[NudgeType]
+) -> dict[NudgeType, GoalSuggestion]:
+    """Query the last year of all sources at once and suggest their goals."""
+    from homeassistant.components.recorder import get_instance
+
+    statistic_ids: set[str] = set().union(
+        *(topology.statistic_ids(nudge_type) for nudge_type in nudge_types)
+    )
+    sums: dict[str, float] = {}
+    if statistic_ids:
+        today = get_start_time(NudgePeriod.Daily)
+        sums = await get_instance(hass).async_add_executor_job(
+            fetch_year_sums,
+            hass,
+            today - timedelta(days=SUGGESTION_DAYS),
+            today,
+            statistic_ids,
+            # Days, because the window does not start with a month.
+            "day",
+        )
+    return suggest_goals(topology, nudge_types, sums)
@@ -0,0 +1,100 @@
+"""Cached energy topology that follows the Energy Dashboard preferences."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.importlib import async_import_module
+
+from .const import (
+    CONF_SUB_METER_GAS,
+    CONF_SUB_METER_GRID_EXPORT,
+    CONF_SUB_METER_GRID_IMPORT,
+    CONF_SUB_METER_SOLAR,
+    CONF_SUB_METER_WATER,
+    CONF_SUB_METERS,
+)
+from .platform import EnergyTopology
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+    import homeassistant.components.energy.data as energydata
+
+DATA_ENERGY_TOPOLOGY = "nudge_household_energy_topology"
+
+type TopologyListener = Callable[[EnergyTopology, EnergyTopology], None]
+
+
+class EnergyTopologyTracker:
+    """
+    Keep the energy topology of Home Assistant parsed once.
+
+    The Energy Manager notifies about saved preferences. The topology is only
+    rebuilt then and listeners are only called when it actually changed.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, energy_manager: energydata.EnergyManager
+    ) -> None:
+        """Parse the current preferences of the Energy Manager."""
+        self.hass = hass
+        self._energy_manager = energy_manager
+        self._topology = EnergyTopology.from_preferences(energy_manager.data)
+        self._listeners: list[TopologyListener] = []
+        energy_manager.async_listen_updates(self._async_preferences_updated)
+
+    @property
+    def topology(self) -> EnergyTopology:
+        """Return the current energy topology."""
+        return self._topology
+
+    @callback
+    def async_add_listener(self, update_callback: TopologyListener) -> CALLBACK_TYPE:
+        """Call back with the old and new topology after every change."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    async def _async_preferences_updated(self) -> None:
+        """Rebuild the topology after the preferences were saved."""
+        topology = EnergyTopology.from_preferences(self._energy_manager.data)
+        if topology == self._topology:
+            return
+        old_topology, self._topology = self._topology, topology
+        for update_callback in list(self._listeners):
+            update_callback(old_topology, topology)
+
+
+async def async_get_energy_topology(hass: HomeAssistant) -> EnergyTopologyTracker:
+    """Return the energy topology tracker shared by all config entries."""
+    if (tracker := hass.data.get(DATA_ENERGY_TOPOLOGY)) is not None:
+        return tracker
+    energy_data = await async_import_module(
+        hass, "homeassistant.components.energy.data"
+    )
+    energy_manager = await energy_data.async_get_manager(hass)
+    # The Energy Manager offers no way to stop listening, so there is one tracker.
+    if (tracker := hass.data.get(DATA_ENERGY_TOPOLOGY)) is None:
+        tracker = hass.data[DATA_ENERGY_TOPOLOGY] = EnergyTopologyTracker(
+            hass, energy_manager
+        )
+    return tracker
+
+
+def get_sub_meter_topology(data: Mapping[str, Any]) -> EnergyTopology | None:
+    """Return the topology of the sub meters of a household, None without any."""
+    if not any(data.get(conf) for conf in CONF_SUB_METERS):
+        return None
+    return EnergyTopology.from_meters(
+        grid_import=data.get(CONF_SUB_METER_GRID_IMPORT, []),
+        grid_export=data.get(CONF_SUB_METER_GRID_EXPORT, []),
+        solar=data.get(CONF_SUB_METER_SOLAR, []),
+        gas=data.get(CONF_SUB_METER_GAS, []),
+        water=data.get(CONF_SUB_METER_WATER, []),
+    )